@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexAnalyze.py
+@version: 0.1
+@description:
+Batch position analysis. Reads one position per line, either a JSON object
+{"id": ..., "size": 11, "moves": ["F5", "E6", ...]} (HexTournament's --output records work as
+they are) or a plain line of moves separated by spaces. The board is built with update_board,
+the side to move searches it with HexAgent.minimax, and every result is written as one JSON line
+once it is ready. Results come back in completion order. Only a bounded window of positions is
+in flight at a time, so memory stays flat however long the input is. Scores follow the search:
+lower is better for the side to move. Workers reuse an agent's board between positions but clear
+its search tables, so with a fixed depth a position gets the same result in any run; with a time
+budget the result also depends on the machine's speed.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import getopt
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from HexPlayer import HexAgent, parseMove, VALUE_EMPTY, VALUE_RED, TT_DEFAULT_SIZE, FIXED_DEPTH, DEFAULT_EVALUATOR, FRONTIER_RADIUS, SEARCHES
+from HexEvaluator import EVALUATORS
+
+WINDOW_PER_JOB = 4  # positions in flight per worker
+ANALYZE_AGENTS = {}  # (board size, color, settings) -> HexAgent, per worker process
+
+def parseRecord(line, number, boardSize):
+    # (id, board size, move texts), ValueError when the line is not a position
+    line = line.strip()
+    if line.startswith("{"):
+        record = json.loads(line)
+        moves = record.get("moves", [])
+        if not isinstance(moves, list):
+            moves = str(moves).split()
+        return record.get("id", number), int(record.get("size", boardSize)), [str(move) for move in moves]
+    return number, boardSize, line.split()
+
+def expandRecord(key, boardSize, moves, every):
+    # the final position, or with every the position before each move and after the last
+    if not every:
+        yield (key, boardSize, moves)
+        return
+    for ply in range(len(moves) + 1):
+        yield ("{}:{}".format(key, ply), boardSize, moves[:ply])
+
+def readPositions(lines, boardSize, every=False):
+    # lazily turns input lines into (id, board size, move texts) tasks, bad lines become errors
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            key, size, moves = parseRecord(line, number, boardSize)
+        except (ValueError, TypeError) as error:
+            yield (number, None, str(error))
+            continue
+        for task in expandRecord(key, size, moves, every):
+            yield task
+
+def positionAgent(boardSize, color, settings, history):
+    # reuses the worker's agent for this size and side, keeping only the moves it shares with
+    # history; nothing learned on an earlier position carries over
+    moveTime, depth, evaluator, book, solve, ttSize, search = settings
+    key = (boardSize, color, settings)
+    if key not in ANALYZE_AGENTS:
+        ANALYZE_AGENTS[key] = HexAgent(boardSize, color, ttSize, moveTime, FRONTIER_RADIUS, evaluator, 1, book, solve, search)
+    agent = ANALYZE_AGENTS[key]
+    common = 0
+    while(common < len(history) and common < len(agent.moveHistory) and agent.moveHistory[common] == history[common][0]):
+        common += 1
+    agent.unwindSearch(common)
+    for (move, value) in history[common:]:
+        agent.update_board(agent.hexBoard, move, value)
+    agent.clearSearch()
+    agent.fixedDepth = depth
+    # the opening rule answers without a score, so every position is searched instead
+    agent.firstMove = False
+    return agent
+
+def analyzePosition(task):
+    key, boardSize, moves, settings = task
+    if boardSize is None:
+        return {"id": key, "error": moves}
+    result = {"id": key, "ply": len(moves)}
+    if boardSize <= 0 or boardSize > 26:
+        result["error"] = "invalid size {}".format(boardSize)
+        return result
+
+    # check every move first, update_board exits the process on an invalid one
+    history = []
+    taken = set()
+    value = VALUE_RED
+    for inp in moves:
+        move = parseMove(inp, boardSize)
+        if move is None or move in taken:
+            result["error"] = "invalid move {}".format(inp)
+            return result
+        taken.add(move)
+        history.append((move, value))
+        value = -value
+    if len(history) == boardSize*boardSize:
+        result["error"] = "board is full"
+        return result
+
+    start = time.time()
+    agent = positionAgent(boardSize, value, settings, history)
+    if agent.winner != VALUE_EMPTY:
+        result["error"] = "game is over"
+        return result
+    move = agent.minimax()
+    elapsed = time.time() - start
+    result.update({
+        "toMove": "RED" if value == VALUE_RED else "BLUE",
+        "move": agent.pos_to_inp(move),
+        "score": agent.rootScore,
+        "depth": agent.depthReached,
+        "nodes": agent.nodes,
+        "solved": agent.solverResult,
+        "time": round(elapsed, 4),
+    })
+    return result
+
+def analyzePositions(positions, jobs, settings, window=None):
+    # yields one result dict per (id, board size, move texts) position as soon as it is done,
+    # never holding more than window positions at once
+    if window is None:
+        window = jobs * WINDOW_PER_JOB
+    positions = iter(positions)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = set()
+        exhausted = False
+        while(True):
+            while(not exhausted and len(pending) < window):
+                try:
+                    key, boardSize, moves = next(positions)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(analyzePosition, (key, boardSize, moves, settings)))
+            if len(pending) == 0:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "s:t:j:i:o:", ["size=","time=","jobs=","input=","output=","depth=","eval=","book=","solve=","ttsize=","every","search="])
+    except getopt.GetoptError:
+        print('Error: HexAnalyze.py [-s <board_size>] [-t <seconds_per_move>] [-j <jobs>] [-i <file>] [-o <file>]')
+        print('.  or: HexAnalyze.py [--size=<board_size>] [--time=<seconds_per_move>] [--jobs=<jobs>] [--input=<file>] [--output=<file>] [--depth=<plies>] [--eval=<evaluator>] [--book=<file>] [--solve=<empties>] [--ttsize=<entries>] [--every] [--search=<alphabeta|pvs>]')
+        sys.exit(2)
+
+    arg_size = 7
+    arg_time = None
+    arg_jobs = os.cpu_count() or 1
+    arg_input = None
+    arg_output = None
+    arg_depth = FIXED_DEPTH
+    arg_eval = DEFAULT_EVALUATOR
+    arg_book = None
+    arg_solve = None
+    arg_ttsize = TT_DEFAULT_SIZE
+    arg_every = False
+    arg_search = "alphabeta"
+    for opt, arg in opts:
+        try:
+            if opt in ("-s","--size"):
+                arg_size = int(arg)
+                if arg_size<=0 or arg_size>26:
+                    raise Exception()
+            elif opt in ("-t","--time"):
+                arg_time = float(arg)
+                if arg_time<=0:
+                    raise Exception()
+            elif opt in ("-j","--jobs"):
+                arg_jobs = int(arg)
+                if arg_jobs<=0:
+                    raise Exception()
+            elif opt in ("-i","--input"):
+                arg_input = arg
+            elif opt in ("-o","--output"):
+                arg_output = arg
+            elif opt == "--depth":
+                arg_depth = int(arg)
+                if arg_depth<0:
+                    raise Exception()
+            elif opt == "--eval":
+                arg_eval = arg.lower()
+                if not (arg_eval == "legacy" or arg_eval in EVALUATORS):
+                    raise Exception()
+            elif opt == "--book":
+                arg_book = arg
+            elif opt == "--solve":
+                arg_solve = int(arg)
+                if arg_solve<0:
+                    raise Exception()
+            elif opt == "--ttsize":
+                arg_ttsize = int(arg)
+                if arg_ttsize<=0:
+                    raise Exception()
+            elif opt == "--every":
+                arg_every = True
+            elif opt == "--search":
+                arg_search = arg.lower()
+                if not arg_search in SEARCHES:
+                    raise Exception()
+        except Exception:
+            print('Error: Invalid {} value "{}".'.format(opt, arg))
+            sys.exit(2)
+
+    settings = (arg_time, arg_depth, arg_eval, arg_book, arg_solve, arg_ttsize, arg_search)
+    inputFile = open(arg_input) if arg_input is not None else sys.stdin
+    outputFile = open(arg_output, "w") if arg_output is not None else sys.stdout
+    start = time.time()
+    count = 0
+    try:
+        for result in analyzePositions(readPositions(inputFile, arg_size, arg_every), arg_jobs, settings):
+            outputFile.write(json.dumps(result, sort_keys=True) + "\n")
+            outputFile.flush()
+            count += 1
+    except (ImportError, IOError) as error:
+        print('Error: {}.'.format(error))
+        sys.exit(2)
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    print("# {} positions in {:.1f}s with {} jobs".format(count, time.time() - start, arg_jobs), file=sys.stderr)
+
+if __name__=="__main__":
+    main(sys.argv[1:])
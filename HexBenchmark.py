@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexBenchmark.py
+@version: 0.1
+@description:
+Micro benchmarks for the HexAgent hot paths on seeded positions. Results are seconds per call,
+the best of several repeats that each run for at least BENCH_MIN_TIME, saved as JSON with the
+spread of the repeats as each benchmark's noise. Given a baseline file it exits with status 1
+when any benchmark got slower than the threshold, widened for noisy benchmarks, allows.
+'''
+
+from __future__ import print_function
+
+import gc
+import sys
+import json
+import time
+import random
+import getopt
+import platform
+
+from HexPlayer import HexAgent, VALUE_EMPTY, VALUE_RED, VALUE_BLUE, DEFAULT_EVALUATOR, SEARCHES
+
+BENCH_VERSION = 1
+BENCH_SEED = 2017
+BENCH_SIZES = [7, 11, 13, 19, 26]
+BENCH_FILL = 0.3  # share of the cells holding stones in a benchmark position
+BENCH_REPEATS = 5
+BENCH_MIN_TIME = 0.2  # seconds each repeat keeps calling a benchmark for
+BENCH_THRESHOLD = 0.10  # allowed slowdown before a benchmark counts as a regression
+BENCH_NOISE_FACTOR = 3  # a noisy benchmark may also slow down by this many times its noise
+BENCH_SEARCH_DEPTH = 1  # fixed depth of the minimax benchmark, deeper is too slow on big boards
+
+def benchPosition(boardSize, seed, evaluator, bitboard, search="alphabeta"):
+    # alternate random stones up to the fill level, skipping any stone that would end the game;
+    # the solver stays off so the minimax benchmark always measures the search
+    generator = random.Random(seed * 100 + boardSize)
+    agent = HexAgent(boardSize, VALUE_RED, evaluator=evaluator, solve=0, search=search, bitboard=bitboard)
+    cells = [(i, j) for i in range(boardSize) for j in range(boardSize)]
+    generator.shuffle(cells)
+    value = VALUE_RED
+    stones = int(BENCH_FILL * len(cells))
+    for move in cells:
+        if(len(agent.moveHistory) >= stones):
+            break
+        agent.nextState(move, value)
+        if(agent.winner != VALUE_EMPTY):
+            agent.revertState(move)
+            continue
+        value = -value
+    # the agent is to move, so its color is the side to move
+    if(value == VALUE_BLUE):
+        history = [(move, agent.hexBoard[move[0]][move[1]]) for move in agent.moveHistory]
+        agent = HexAgent(boardSize, VALUE_BLUE, evaluator=evaluator, solve=0, search=search, bitboard=bitboard)
+        agent.syncHistory(history)
+    agent.firstMove = False
+    agent.fixedDepth = BENCH_SEARCH_DEPTH
+    return agent
+
+def benchStateChanges(agent):
+    moves = agent.getAdjacentMoves()
+    for move in moves:
+        agent.nextState(move, agent.color)
+        agent.revertState(move)
+    return len(moves)
+
+def benchAdjacentMoves(agent):
+    for x in range(100):
+        agent.getAdjacentMoves()
+    return 100
+
+def benchHeuristicValue(agent):
+    for x in range(100):
+        agent.heuristicValue(agent.hexBoard)
+    return 100
+
+def benchNumberOfConnections(agent):
+    for move in agent.playersMoves:
+        agent.numberOfConnections(move, [agent.boardSize, -1], {})
+    return max(1, len(agent.playersMoves))
+
+def benchGameOver(agent):
+    for x in range(1000):
+        agent.gameOver(agent.hexBoard)
+    return 1000
+
+def benchEvaluatePosition(agent):
+    for x in range(5):
+        agent.evaluatePosition()
+    return 5
+
+def benchMinimax(agent):
+    # a cold fixed depth search from the position
+    agent.transpositionTable.clear()
+    agent.historyTable = {VALUE_RED: {}, VALUE_BLUE: {}}
+    agent.minimax()
+    return 1
+
+BENCHMARKS = [
+    ("nextState/revertState", benchStateChanges),
+    ("getAdjacentMoves", benchAdjacentMoves),
+    ("heuristicValue", benchHeuristicValue),
+    ("numberOfConnections", benchNumberOfConnections),
+    ("gameOver", benchGameOver),
+    ("evaluatePosition", benchEvaluatePosition),
+    ("minimax", benchMinimax),
+]
+
+def timeBench(bench, agent):
+    # seconds per call, calling bench until BENCH_MIN_TIME has passed so that timer resolution
+    # and scheduler noise stay small next to the measured time; like timeit, the collector is
+    # off so its pauses do not land on whichever benchmark happens to trigger them
+    calls = 0
+    collecting = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        while(True):
+            calls += bench(agent)
+            elapsed = time.perf_counter() - start
+            if(elapsed >= BENCH_MIN_TIME):
+                return elapsed / calls
+    finally:
+        if(collecting):
+            gc.enable()
+
+def runBenchmarks(sizes, repeats, evaluator, bitboard, selected=None, log=None, search="alphabeta"):
+    # best seconds per call and the noise of every benchmark; the repeats take turns over the
+    # benchmarks so a slow spell of the machine hits all of them rather than one
+    results = {}
+    noise = {}
+    for boardSize in sizes:
+        agent = benchPosition(boardSize, BENCH_SEED, evaluator, bitboard, search)
+        benches = [(name, bench) for (name, bench) in BENCHMARKS if selected is None or name in selected]
+        timings = {name: [] for (name, bench) in benches}
+        for repeat in range(repeats):
+            for (name, bench) in benches:
+                timings[name].append(timeBench(bench, agent))
+        for (name, bench) in benches:
+            key = "{}/{}".format(boardSize, name)
+            samples = sorted(timings[name])
+            results[key] = samples[0]
+            # the median repeat's excess over the best one, 0 from a single repeat
+            noise[key] = samples[len(samples)//2] / samples[0] - 1
+            if(log is not None):
+                print("# {:<28} {:>12.3f} us {:>6.1f}% noise".format(key, results[key] * 1e6, noise[key] * 100), file=log)
+        agent.close()
+    return results, noise
+
+def compareResults(current, baseline, threshold, noise=None):
+    # returns the keys that slowed down by more than their threshold, which widens to
+    # BENCH_NOISE_FACTOR times the larger noise either run measured for that benchmark
+    if(noise is None):
+        noise = {}
+    regressions = []
+    print("# {:<28} {:>12} {:>12} {:>8} {:>8}".format("benchmark", "baseline us", "current us", "change", "allowed"))
+    for key in sorted(current, key=lambda key: (int(key.split("/")[0]), key)):
+        if key not in baseline:
+            continue
+        change = current[key] / baseline[key] - 1
+        allowed = max(threshold, BENCH_NOISE_FACTOR * noise.get(key, 0.0))
+        flag = ""
+        if(change > allowed):
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print("# {:<28} {:>12.3f} {:>12.3f} {:>+7.1f}% {:>7.1f}%{}".format(key, baseline[key] * 1e6, current[key] * 1e6, change * 100, allowed * 100, flag))
+    return regressions
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "s:r:o:b:", ["sizes=","repeats=","output=","baseline=","threshold=","eval=","bitboard","bench=","search="])
+    except getopt.GetoptError:
+        print('Error: HexBenchmark.py [-s <sizes>] [-r <repeats>] [-o <file>] [-b <baseline_file>]')
+        print('.  or: HexBenchmark.py [--sizes=<size,size,...>] [--repeats=<repeats>] [--output=<file>] [--baseline=<file>] [--threshold=<fraction>] [--eval=<evaluator>] [--bitboard] [--bench=<name,name,...>] [--search=<alphabeta|pvs>]')
+        sys.exit(2)
+
+    arg_sizes = BENCH_SIZES
+    arg_repeats = BENCH_REPEATS
+    arg_output = None
+    arg_baseline = None
+    arg_threshold = BENCH_THRESHOLD
+    arg_eval = DEFAULT_EVALUATOR
+    arg_bitboard = False
+    arg_bench = None
+    arg_search = "alphabeta"
+    for opt, arg in opts:
+        try:
+            if opt in ("-s","--sizes"):
+                arg_sizes = [int(size) for size in arg.split(",")]
+                if min(arg_sizes)<=0 or max(arg_sizes)>26:
+                    raise Exception()
+            elif opt in ("-r","--repeats"):
+                arg_repeats = int(arg)
+                if arg_repeats<=0:
+                    raise Exception()
+            elif opt in ("-o","--output"):
+                arg_output = arg
+            elif opt in ("-b","--baseline"):
+                arg_baseline = arg
+            elif opt == "--threshold":
+                arg_threshold = float(arg)
+                if arg_threshold<0:
+                    raise Exception()
+            elif opt == "--eval":
+                arg_eval = arg.lower()
+            elif opt == "--bitboard":
+                arg_bitboard = True
+            elif opt == "--bench":
+                arg_bench = arg.split(",")
+                if not set(arg_bench) <= set(name for (name, bench) in BENCHMARKS):
+                    raise Exception()
+            elif opt == "--search":
+                arg_search = arg.lower()
+                if not arg_search in SEARCHES:
+                    raise Exception()
+        except Exception:
+            print('Error: Invalid {} value "{}".'.format(opt, arg))
+            sys.exit(2)
+
+    baseline = None
+    if arg_baseline is not None:
+        try:
+            with open(arg_baseline) as baselineFile:
+                baseline = json.load(baselineFile)
+        except (IOError, ValueError) as error:
+            print('Error: Cannot read baseline: {}.'.format(error))
+            sys.exit(2)
+
+    try:
+        results, noise = runBenchmarks(arg_sizes, arg_repeats, arg_eval, arg_bitboard, arg_bench, sys.stderr, arg_search)
+    except (ImportError, KeyError) as error:
+        print('Error: {}.'.format(error))
+        sys.exit(2)
+    report = {
+        "version": BENCH_VERSION,
+        "seed": BENCH_SEED,
+        "python": platform.python_version(),
+        "eval": arg_eval,
+        "bitboard": arg_bitboard,
+        "search": arg_search,
+        "results": results,
+        "noise": noise,
+    }
+    if arg_output is not None:
+        with open(arg_output, "w") as outputFile:
+            json.dump(report, outputFile, indent=1, sort_keys=True)
+
+    if baseline is not None:
+        if(baseline.get("eval") != arg_eval or baseline.get("bitboard", False) != arg_bitboard or baseline.get("search", "alphabeta") != arg_search):
+            print("# warning: baseline ran with --eval={} bitboard={} search={}".format(baseline.get("eval"), baseline.get("bitboard", False), baseline.get("search", "alphabeta")))
+        # older baselines carry no noise, their benchmarks keep the plain threshold
+        baselineNoise = baseline.get("noise", {})
+        worstNoise = {key: max(noise[key], baselineNoise.get(key, 0.0)) for key in noise}
+        regressions = compareResults(results, baseline["results"], arg_threshold, worstNoise)
+        if len(regressions) > 0:
+            print("# {} benchmarks regressed by more than their threshold of at least {:.0f}%".format(len(regressions), arg_threshold * 100))
+            sys.exit(1)
+
+if __name__=="__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexEvaluator.py
+@version: 0.1
+@description:
+Position evaluators for HexAgent. Scores follow the search's convention: lower is better for the
+agent. "twodistance" is pure Python on BitBoard masks, "resistance" needs numpy and scores
+batches of boards with block tridiagonal solves, "montecarlo" needs numpy and scores them with
+batched random playouts.
+'''
+
+from __future__ import print_function
+
+import HexPlayout
+from HexGeometry import boardGeometry, BitBoard, VALUE_EMPTY, VALUE_RED, VALUE_BLUE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+STONE_RESISTANCE = 1e-4  # own stones conduct almost freely
+GROUND_LEAK = 1e-9  # keeps cut-off cells from making the system singular
+RESISTANCE_BATCH = 64  # boards per block solve
+MONTE_CARLO_PLAYOUTS = 64  # per board
+MONTE_CARLO_SEED = 165
+
+class TwoDistanceEvaluator:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize, color):
+        self.geometry = boardGeometry(boardSize)
+        self.color = color
+        self.batched = False
+        # evaluateBits scores a BitBoard without reading the list board, evaluate loads the
+        # list board into this one first
+        self.bitwise = True
+        self.bitBoard = BitBoard(boardSize)
+        # scores do not change when the board is turned 180 degrees
+        self.symmetric = True
+        # potential dominates mobility, which never exceeds the cell count
+        self.scale = self.geometry.cells + 1
+        self.unreachable = 2*self.geometry.cells
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def evaluate(self, board):
+        return self.evaluateBits(self.bitBoard.load(board))
+
+    def evaluateBatch(self, boards):
+        return [self.evaluate(board) for board in boards]
+
+    def evaluateBits(self, bitBoard):
+        # every two-distance layer is a few whole board masks
+        return self.colorBitsValue(bitBoard, self.color) - self.colorBitsValue(bitBoard, -self.color)
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def colorBitsValue(self, bitBoard, color):
+        potential, mobility = self.bitsPotential(bitBoard, color)
+        return potential*self.scale - mobility
+
+    def bitsPotential(self, bitBoard, color):
+        geometry = self.geometry
+        own = bitBoard.stones(color)
+        empty = bitBoard.empty()
+        edgeA, edgeB = geometry.edgeMasks[color]
+        startA = empty & edgeA
+        startB = empty & edgeB
+        # liberties of each own group, a group touching an edge starts from its liberties
+        groups = []
+        rest = own
+        while(rest):
+            group = bitBoard.floodFill(rest & -rest, own)
+            rest &= ~group
+            liberties = geometry.spread(group) & empty
+            if(liberties):
+                groups.append(liberties)
+                if(group & edgeA):
+                    startA |= liberties
+                if(group & edgeB):
+                    startB |= liberties
+
+        layersA = self.twoDistanceLayers(empty, groups, startA)
+        layersB = self.twoDistanceLayers(empty, groups, startB)
+        potential = self.unreachable
+        mobility = 0
+        for distanceA, layerA in enumerate(layersA, 1):
+            for distanceB, layerB in enumerate(layersB, 1):
+                total = distanceA + distanceB
+                if(total > potential):
+                    break
+                both = layerA & layerB
+                if(both):
+                    if(total < potential):
+                        potential = total
+                        mobility = 0
+                    mobility += bin(both).count("1")
+        return potential, mobility
+
+    def twoDistanceLayers(self, empty, groups, start):
+        # layer d+1 holds the cells with two distinct neighbors in layers 1..d, where the
+        # liberties of one own group are all neighbors of each other
+        geometry = self.geometry
+        width = geometry.width
+        layers = []
+        layer = start
+        reached = 0
+        # cells with at least one and at least two board neighbors in reached
+        ones = 0
+        twos = 0
+        # liberties of groups with two reached liberties, and the groups still below that
+        shared = 0
+        pending = groups
+        while(layer):
+            layers.append(layer)
+            reached |= layer
+            for shifted in (layer << 1, layer >> 1, layer << width, layer >> width,
+                            layer << (width-1), layer >> (width-1)):
+                twos |= ones & shifted
+                ones |= shifted
+            # a group with one reached liberty gives its other liberties that witness, groups
+            # sharing a witness count it once
+            witnesses = {}
+            below = []
+            for liberties in pending:
+                touched = liberties & reached
+                if(touched & (touched - 1)):
+                    shared |= liberties
+                else:
+                    below.append(liberties)
+                    if(touched):
+                        witnesses[touched] = witnesses.get(touched, 0) | liberties
+            pending = below
+            advance = twos | shared
+            seen = 0
+            for witness, liberties in witnesses.items():
+                advance |= seen & liberties
+                seen |= liberties
+                # a board neighbor in reached other than the witness itself
+                advance |= liberties & ones & ~geometry.neighborMasks[witness.bit_length() - 1]
+            layer = advance & empty & ~reached
+        return layers
+
+class ResistanceEvaluator:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize, color):
+        if np is None:
+            raise ImportError("the resistance evaluator needs numpy")
+        geometry = boardGeometry(boardSize)
+        self.geometry = geometry
+        self.boardSize = boardSize
+        self.color = color
+        self.batched = True
+        self.bitwise = False
+        self.symmetric = True
+        links = np.array(geometry.links, dtype=np.intp).reshape(-1, 2)
+        self.linkA = links[:, 0]
+        self.linkB = links[:, 1]
+        # ordered by rows the system is block tridiagonal: links inside a row fill the NxN
+        # diagonal blocks, links to the next row the blocks above them
+        rowA = self.linkA // boardSize
+        inRow = (rowA == self.linkB // boardSize)
+        self.rowLinks = (rowA[inRow], self.linkA[inRow] % boardSize, self.linkB[inRow] % boardSize, inRow)
+        self.nextLinks = (rowA[~inRow], self.linkA[~inRow] % boardSize, self.linkB[~inRow] % boardSize, ~inRow)
+        self.edgeA = {value: np.array(geometry.edges[value][0], dtype=np.intp) for value in (VALUE_RED, VALUE_BLUE)}
+        self.edgeB = {value: np.array(geometry.edges[value][1], dtype=np.intp) for value in (VALUE_RED, VALUE_BLUE)}
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def evaluate(self, board):
+        return self.evaluateBatch([board])[0]
+
+    def evaluateBatch(self, boards):
+        # boards: sequence of NxN boards or a (K,N,N) array, solved RESISTANCE_BATCH boards at a
+        # time so memory stays bounded however many children a node has
+        stack = np.asarray(boards, dtype=np.int8).reshape(len(boards), -1)
+        scores = []
+        for start in range(0, len(stack), RESISTANCE_BATCH):
+            chunk = stack[start:start + RESISTANCE_BATCH]
+            mine = self.resistance(chunk, self.color)
+            theirs = self.resistance(chunk, -self.color)
+            scores.extend(float(score) for score in np.log(mine / theirs))
+        return scores
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def resistance(self, stack, color):
+        # two-terminal resistance between color's edges: edge A is held at 1 volt, edge B and
+        # the leak at ground, and the resistance is 1 over the current leaving edge A
+        count, cells = stack.shape
+        size = self.boardSize
+        cellResistance = np.where(stack == color, STONE_RESISTANCE, 1.0)
+        cellResistance[stack == -color] = np.inf
+        conductance = 1.0 / (cellResistance[:, self.linkA] + cellResistance[:, self.linkB])
+
+        degree = np.full((count, cells), GROUND_LEAK)
+        np.add.at(degree, (slice(None), self.linkA), conductance)
+        np.add.at(degree, (slice(None), self.linkB), conductance)
+        source = np.zeros((count, cells))
+        edgeA = self.edgeA[color]
+        source[:, edgeA] = 1.0 / cellResistance[:, edgeA]
+        degree += source
+        edgeB = self.edgeB[color]
+        degree[:, edgeB] += 1.0 / cellResistance[:, edgeB]
+
+        # blocks[:, i] couples row i to itself, above[:, i] row i to row i+1
+        blocks = np.zeros((count, size, size, size))
+        row, a, b, inRow = self.rowLinks
+        blocks[:, row, a, b] = -conductance[:, inRow]
+        blocks[:, row, b, a] = -conductance[:, inRow]
+        diagonal = np.arange(size)
+        blocks[:, :, diagonal, diagonal] = degree.reshape(count, size, size)
+        above = np.zeros((count, size, size, size))
+        row, a, b, nextRow = self.nextLinks
+        above[:, row, a, b] = -conductance[:, nextRow]
+        current = source.reshape(count, size, size, 1)
+
+        # block Thomas algorithm: eliminate row by row, then substitute back
+        reduced = []
+        block = blocks[:, 0]
+        right = current[:, 0]
+        for i in range(size):
+            if(i > 0):
+                below = np.swapaxes(above[:, i-1], 1, 2)
+                block = blocks[:, i] - below @ reduced[-1][:, :, :size]
+                right = current[:, i] - below @ reduced[-1][:, :, size:]
+            reduced.append(np.linalg.solve(block, np.concatenate((above[:, i], right), axis=2)))
+        voltage = np.zeros((count, size, size))
+        nextVoltage = np.zeros((count, size, 1))
+        for i in range(size-1, -1, -1):
+            nextVoltage = reduced[i][:, :, size:] - reduced[i][:, :, :size] @ nextVoltage
+            voltage[:, i] = nextVoltage[:, :, 0]
+
+        flow = (source * (1.0 - voltage.reshape(count, cells))).sum(axis=1) + GROUND_LEAK
+        return 1.0 / flow
+
+class MonteCarloEvaluator:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize, color, playouts=MONTE_CARLO_PLAYOUTS):
+        self.random = HexPlayout.makeRandom(MONTE_CARLO_SEED)
+        self.color = color
+        self.playouts = playouts
+        self.batched = True
+        self.bitwise = False
+        self.symmetric = True
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def evaluate(self, board):
+        return self.evaluateBatch([board])[0]
+
+    def evaluateBatch(self, boards):
+        # every board is repeated playouts times and all of them are played out in one call
+        stack = np.asarray(boards, dtype=np.int8)
+        repeated = np.repeat(stack, self.playouts, axis=0)
+        results = HexPlayout.playouts(repeated, self.random).reshape(len(stack), self.playouts)
+        wins = (results == self.color).mean(axis=1)
+        return [float(score) for score in 1.0 - 2.0*wins]
+
+EVALUATORS = {"twodistance": TwoDistanceEvaluator, "resistance": ResistanceEvaluator, "montecarlo": MonteCarloEvaluator}
+
+def makeEvaluator(name, boardSize, color):
+    # "legacy" keeps HexAgent.heuristicValue
+    if(name == "legacy"):
+        return None
+    return EVALUATORS[name](boardSize, color)
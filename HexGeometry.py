@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexGeometry.py
+@version: 0.1
+@description:
+Board geometry shared by every module. Cells are numbered i*boardSize + j. boardGeometry builds
+the neighbor and edge tables once per board size, and every agent, evaluator, engine and game
+of that size uses the same instance. BitBoard keeps a position as two int masks on the same
+tables, so neighbor sets and flood fills are shifts and ANDs over the whole board.
+'''
+
+from __future__ import print_function
+
+VALUE_EMPTY = 0
+VALUE_RED = 1  # connects the left and right columns
+VALUE_BLUE = -1  # connects the top and bottom rows
+NEIGHBOR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (1, -1), (-1, 1))
+GEOMETRY_TABLES = {}  # board size -> HexGeometry
+
+class HexGeometry:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize):
+        self.boardSize = boardSize
+        self.cells = boardSize*boardSize
+        self.neighbors = []
+        for i in range(boardSize):
+            for j in range(boardSize):
+                cellNeighbors = []
+                for (di, dj) in NEIGHBOR_OFFSETS:
+                    ni = i + di
+                    nj = j + dj
+                    if 0 <= ni < boardSize and 0 <= nj < boardSize:
+                        cellNeighbors.append(ni*boardSize + nj)
+                self.neighbors.append(cellNeighbors)
+        # cells on each color's two edges
+        self.edges = {
+            VALUE_RED: ([i*boardSize for i in range(boardSize)], [i*boardSize + boardSize-1 for i in range(boardSize)]),
+            VALUE_BLUE: (list(range(boardSize)), [(boardSize-1)*boardSize + j for j in range(boardSize)]),
+        }
+        # per cell and color the edge nodes it touches, numbered after the cells: RED's two
+        # sides, then BLUE's
+        self.edgeNodes = [{VALUE_RED: [], VALUE_BLUE: []} for cell in range(self.cells)]
+        for (value, first) in ((VALUE_RED, self.cells), (VALUE_BLUE, self.cells+2)):
+            for side in range(2):
+                for cell in self.edges[value][side]:
+                    self.edgeNodes[cell][value].append(first + side)
+        self.links = [(a, b) for a in range(self.cells) for b in self.neighbors[a] if a < b]
+
+        # bit masks: cell (i,j) is bit i*width + j, the spare column stops shifts wrapping
+        # across rows
+        self.width = boardSize + 1
+        self.rowMasks = [((1 << boardSize) - 1) << (i*self.width) for i in range(boardSize)]
+        self.colMasks = [sum(1 << (i*self.width + j) for i in range(boardSize)) for j in range(boardSize)]
+        self.cellMask = sum(self.rowMasks)
+        self.edgeMasks = {
+            VALUE_RED: (self.colMasks[0], self.colMasks[-1]),
+            VALUE_BLUE: (self.rowMasks[0], self.rowMasks[-1]),
+        }
+        # neighbor mask of every bit index, spare column entries stay 0
+        self.neighborMasks = [0] * (boardSize*self.width)
+        for i in range(boardSize):
+            for j in range(boardSize):
+                self.neighborMasks[i*self.width + j] = self.spread(1 << (i*self.width + j))
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def spread(self, mask):
+        # cells next to any cell of mask, six shifts of the whole board at once
+        width = self.width
+        spread = (mask << 1) | (mask >> 1) | (mask << width) | (mask >> width) | (mask << (width-1)) | (mask >> (width-1))
+        return spread & self.cellMask
+
+def boardGeometry(boardSize):
+    if boardSize not in GEOMETRY_TABLES:
+        GEOMETRY_TABLES[boardSize] = HexGeometry(boardSize)
+    return GEOMETRY_TABLES[boardSize]
+
+class BitBoard:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize):
+        self.geometry = boardGeometry(boardSize)
+        self.boardSize = boardSize
+        self.width = self.geometry.width
+        self.red = 0
+        self.blue = 0
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def bit(self, move):
+        return 1 << (move[0]*self.width + move[1])
+
+    def place(self, move, value):
+        if(value == VALUE_RED):
+            self.red |= self.bit(move)
+        else:
+            self.blue |= self.bit(move)
+
+    def remove(self, move):
+        clear = ~self.bit(move)
+        self.red &= clear
+        self.blue &= clear
+
+    def load(self, board):
+        # masks of an NxN list board
+        self.red = 0
+        self.blue = 0
+        for i, row in enumerate(board):
+            for j, value in enumerate(row):
+                if(value == VALUE_RED):
+                    self.red |= 1 << (i*self.width + j)
+                elif(value == VALUE_BLUE):
+                    self.blue |= 1 << (i*self.width + j)
+        return self
+
+    def stones(self, value):
+        if(value == VALUE_RED):
+            return self.red
+        return self.blue
+
+    def empty(self):
+        return self.geometry.cellMask & ~(self.red | self.blue)
+
+    def floodFill(self, seed, own):
+        group = seed & own
+        while(True):
+            grown = (group | self.geometry.spread(group)) & own
+            if(grown == group):
+                return group
+            group = grown
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexMCTS.py
+@version: 0.1
+@description:
+Monte Carlo tree search engine for HexAgent, UCT with RAVE/AMAF statistics. The tree is kept
+between moves and re-rooted on the moves played since the last search.
+'''
+
+from __future__ import print_function
+
+import math
+import random
+import time
+
+from HexGeometry import boardGeometry, VALUE_EMPTY, VALUE_RED, VALUE_BLUE
+
+DEFAULT_PLAYOUTS = 2000  # per move when the agent has no time budget
+RAVE_EQUIVALENCE = 500.0  # visits at which tree and AMAF statistics weigh the same
+UCT_EXPLORATION = 0.2
+
+class MCTSNode:
+    __slots__ = ("move", "player", "parent", "children", "visits", "wins", "amafVisits", "amafWins")
+
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, move, player, parent):
+        # player is the color that played move to reach this node
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = None
+        self.visits = 0
+        self.wins = 0
+        self.amafVisits = 0
+        self.amafWins = 0
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def score(self, logVisits):
+        if(self.visits == 0):
+            mean = 0.5
+        else:
+            mean = self.wins / self.visits
+        if(self.amafVisits > 0):
+            beta = math.sqrt(RAVE_EQUIVALENCE / (3*self.visits + RAVE_EQUIVALENCE))
+            mean = (1-beta)*mean + beta*(self.amafWins / self.amafVisits)
+        return mean + UCT_EXPLORATION*math.sqrt(logVisits / (self.visits + 1))
+
+class MCTSEngine:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, hexAgent, seed=None):
+        self.agent = hexAgent
+        self.boardSize = hexAgent.boardSize
+        self.geometry = boardGeometry(hexAgent.boardSize)
+        self.random = random.Random(seed)
+        self.root = None
+        self.rootLength = 0
+        self.playouts = 0
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def search(self):
+        # pick a move for the agent from its current position
+        agent = self.agent
+        started = time.time()
+        self.playouts = 0
+        move = agent.bookMove()
+        if(move is not None):
+            return move
+        if(agent.emptyCount <= agent.solverEmpties):
+            move = agent.solveEndgame()
+            if(move is not None):
+                return move
+        self.advance()
+        board = [value for row in agent.hexBoard for value in row]
+        empty = [cell for cell in range(len(board)) if board[cell] == VALUE_EMPTY]
+        if(len(empty) == 1):
+            return self.toMove(empty[0])
+
+        if(agent.moveTime is None):
+            deadline = None
+        else:
+            deadline = started + agent.moveTime
+        while(True):
+            self.simulate(board)
+            self.playouts += 1
+            if(deadline is None):
+                if(self.playouts >= DEFAULT_PLAYOUTS):
+                    break
+            elif((self.playouts & 15) == 0 and time.time() > deadline):
+                break
+
+        best = max(self.root.children, key=lambda child: child.visits)
+        return self.toMove(best.move)
+
+    def searchStats(self, elapsed):
+        # the last search's statistics for --stats, depth follows the most visited line
+        depth = 0
+        branching = 0
+        if(self.root is not None and self.playouts > 0):
+            if(self.root.children is not None):
+                branching = len(self.root.children)
+            node = self.root
+            while(node.children):
+                node = max(node.children, key=lambda child: child.visits)
+                if(node.visits == 0):
+                    break
+                depth += 1
+        return {
+            "engine": "mcts",
+            "nodes": self.playouts,
+            "leaves": self.playouts,
+            "cutoffs": 0,
+            "depth": depth,
+            "time": round(elapsed, 4),
+            "nps": int(self.playouts / elapsed) if elapsed > 0 else 0,
+            "branching": branching,
+        }
+
+    def ponder(self, stop):
+        # grow the tree under the opponent's move until stop is set, search keeps the subtree
+        agent = self.agent
+        if(agent.winner != VALUE_EMPTY):
+            return
+        self.advance()
+        board = [value for row in agent.hexBoard for value in row]
+        if(VALUE_EMPTY not in board):
+            return
+        while(not stop.is_set()):
+            self.simulate(board)
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def advance(self):
+        # walk the kept tree down the moves played since the last search
+        history = self.agent.moveHistory
+        node = self.root
+        if(len(history) < self.rootLength):
+            node = None
+        for move in history[self.rootLength:]:
+            if(node is None or node.children is None):
+                node = None
+                break
+            cell = move[0]*self.boardSize + move[1]
+            node = next((child for child in node.children if child.move == cell), None)
+        if(node is None):
+            if(len(history) % 2 == 0):
+                node = MCTSNode(None, VALUE_BLUE, None)
+            else:
+                node = MCTSNode(None, VALUE_RED, None)
+        node.parent = None
+        self.root = node
+        self.rootLength = len(history)
+
+    def simulate(self, rootBoard):
+        board = list(rootBoard)
+        node = self.root
+        path = [node]
+
+        # selection and expansion
+        while(node.children is not None and len(node.children) > 0):
+            logVisits = math.log(node.visits + 1)
+            node = max(node.children, key=lambda child: child.score(logVisits))
+            board[node.move] = node.player
+            path.append(node)
+        if(node.visits > 0 or node is self.root):
+            self.expand(node, board)
+            if(len(node.children) > 0):
+                node = self.random.choice(node.children)
+                board[node.move] = node.player
+                path.append(node)
+
+        # playout, the side to move gets every other remaining cell
+        empty = [cell for cell in range(len(board)) if board[cell] == VALUE_EMPTY]
+        self.random.shuffle(empty)
+        toMove = -node.player
+        for index, cell in enumerate(empty):
+            if(index % 2 == 0):
+                board[cell] = toMove
+            else:
+                board[cell] = -toMove
+        winner = self.winner(board)
+
+        # backpropagation with all-moves-as-first updates for the children along the path
+        for node in path:
+            node.visits += 1
+            if(node.player == winner):
+                node.wins += 1
+            if(node.children is not None):
+                for child in node.children:
+                    if(board[child.move] == child.player):
+                        child.amafVisits += 1
+                        if(child.player == winner):
+                            child.amafWins += 1
+
+    def expand(self, node, board):
+        player = -node.player
+        node.children = [MCTSNode(cell, player, node) for cell in range(len(board)) if board[cell] == VALUE_EMPTY]
+
+    def winner(self, board):
+        # on a full board exactly one color connects, so checking red is enough
+        size = self.boardSize
+        neighbors = self.geometry.neighbors
+        seen = set(cell for cell in self.geometry.edges[VALUE_RED][0] if board[cell] == VALUE_RED)
+        stack = list(seen)
+        while(stack):
+            cell = stack.pop()
+            if(cell % size == size-1):
+                return VALUE_RED
+            for neighbor in neighbors[cell]:
+                if(board[neighbor] == VALUE_RED and neighbor not in seen):
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        return VALUE_BLUE
+
+    def toMove(self, cell):
+        return (cell // self.boardSize, cell % self.boardSize)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexOpeningBook.py
+@version: 0.1
+@description:
+Opening book for HexAgent. A book is a header followed by fixed size (zobrist key, cell) records
+sorted by key, memory-mapped and binary searched. The side to move follows from the stone count,
+so one book serves both colors. Run it directly to build a book offline by searching every
+position of the first plies to a fixed depth. Each result is checked by a deeper search of the
+same position, and positions where the two disagree are left out for the engine to search.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import mmap
+import struct
+import getopt
+
+from HexGeometry import VALUE_RED, VALUE_BLUE
+
+BOOK_MAGIC = b"HEXB"
+BOOK_VERSION = 1
+BOOK_HEADER = struct.Struct("<4sHHI")  # magic, version, board size, record count
+BOOK_RECORD = struct.Struct("<QH")  # zobrist key, cell index
+BOOK_DEPTH = 3  # fixed search depth of a book move
+BOOK_VERIFY = 1  # extra plies of the search that must agree with a book move, 0 skips the check
+BOOK_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+
+def defaultBookPath(boardSize):
+    return os.path.join(BOOK_DIRECTORY, "hex{}.book".format(boardSize))
+
+class OpeningBook:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, path, boardSize):
+        self.boardSize = boardSize
+        with open(path, "rb") as bookFile:
+            self.data = mmap.mmap(bookFile.fileno(), 0, access=mmap.ACCESS_READ)
+        if(len(self.data) < BOOK_HEADER.size):
+            raise ValueError("{} is not an opening book".format(path))
+        magic, version, size, count = BOOK_HEADER.unpack_from(self.data, 0)
+        if(magic != BOOK_MAGIC or version != BOOK_VERSION):
+            raise ValueError("{} is not an opening book".format(path))
+        if(size != boardSize):
+            raise ValueError("{} is a book for board size {}".format(path, size))
+        if(len(self.data) != BOOK_HEADER.size + count*BOOK_RECORD.size):
+            raise ValueError("{} is truncated".format(path))
+        self.count = count
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def lookup(self, key):
+        # book move for the position with this zobrist key, or None
+        low = 0
+        high = self.count
+        while(low < high):
+            middle = (low + high) // 2
+            recordKey, cell = BOOK_RECORD.unpack_from(self.data, BOOK_HEADER.size + middle*BOOK_RECORD.size)
+            if(recordKey < key):
+                low = middle + 1
+            elif(recordKey > key):
+                high = middle
+            else:
+                return (cell // self.boardSize, cell % self.boardSize)
+        return None
+
+    def close(self):
+        self.data.close()
+
+def writeBook(path, boardSize, entries):
+    # entries maps zobrist keys to (i,j) moves
+    directory = os.path.dirname(path)
+    if(directory and not os.path.isdir(directory)):
+        os.makedirs(directory)
+    with open(path, "wb") as bookFile:
+        bookFile.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, boardSize, len(entries)))
+        for key in sorted(entries):
+            move = entries[key]
+            bookFile.write(BOOK_RECORD.pack(key, move[0]*boardSize + move[1]))
+
+def sameMove(agent, move, other):
+    # on a position equal to its 180 degree turn a move and its mirror are the same choice
+    return other == move or (agent.isSymmetric() and other == agent.mirrorMove(move))
+
+def buildBook(boardSize, plies, width, depth, verify, evaluator, moveTime=None, log=None):
+    # search every position whose moves so far are book moves or one of the width first
+    # ordered alternatives, up to plies stones; with moveTime the first search deepens under
+    # that budget instead of stopping at depth
+    from HexPlayer import HexAgent
+
+    entries = {}
+    searched = set()
+    lines = [[]]
+    while(lines):
+        history = lines.pop(0)
+        if(len(history) % 2 == 0):
+            value = VALUE_RED
+        else:
+            value = VALUE_BLUE
+        agent = HexAgent(boardSize, value, moveTime=moveTime, evaluator=evaluator)
+        agent.firstMove = False
+        agent.fixedDepth = depth
+        agent.syncHistory(history)
+        if(agent.hash in searched or agent.mirrorHash in searched or agent.winner != 0 or agent.emptyCount == 0):
+            continue
+        searched.add(agent.hash)
+        move = agent.minimax()
+        line = " ".join(agent.pos_to_inp(m) for (m, v) in history)
+        checked = move
+        if(verify > 0):
+            agent.moveTime = None
+            agent.fixedDepth = agent.depthReached + verify
+            checked = agent.minimax()
+        if(sameMove(agent, move, checked)):
+            entries[agent.hash] = move
+            if(log is not None):
+                print("# {} {} -> {}".format(len(entries), line, agent.pos_to_inp(move)), file=log)
+        elif(log is not None):
+            print("# unstable {} -> {} then {}".format(line, agent.pos_to_inp(move), agent.pos_to_inp(checked)), file=log)
+        if(len(history) + 1 >= plies):
+            continue
+        replies = agent.orderMoves(agent.collapseSymmetricMoves(agent.getAvailableMoves(agent.hexBoard)), None, value)
+        replies = [move] + [reply for reply in replies if reply != move]
+        if(width > 0):
+            replies = replies[:width+1]
+        for reply in replies:
+            lines.append(history + [(reply, value)])
+    return entries
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "s:p:w:d:t:o:", ["size=","plies=","width=","depth=","verify=","time=","output=","eval="])
+    except getopt.GetoptError:
+        print('Error: HexOpeningBook.py [-s <board_size>] [-p <plies>] [-w <width>] [-d <depth>] [-t <seconds_per_move>] [-o <file>]')
+        print('.  or: HexOpeningBook.py [--size=<board_size>] [--plies=<plies>] [--width=<width>] [--depth=<plies>] [--verify=<plies>] [--time=<seconds_per_move>] [--output=<file>] [--eval=<evaluator>]')
+        sys.exit(2)
+
+    arg_size = 7
+    arg_plies = 2
+    arg_width = 0
+    arg_depth = BOOK_DEPTH
+    arg_verify = BOOK_VERIFY
+    arg_time = None
+    arg_output = None
+    arg_eval = "twodistance"
+    for opt, arg in opts:
+        try:
+            if opt in ("-s","--size"):
+                arg_size = int(arg)
+                if arg_size<=0 or arg_size>26:
+                    raise Exception()
+            elif opt in ("-p","--plies"):
+                arg_plies = int(arg)
+                if arg_plies<=0:
+                    raise Exception()
+            elif opt in ("-w","--width"):
+                arg_width = int(arg)
+                if arg_width<0:
+                    raise Exception()
+            elif opt in ("-d","--depth"):
+                arg_depth = int(arg)
+                if arg_depth<0:
+                    raise Exception()
+            elif opt == "--verify":
+                arg_verify = int(arg)
+                if arg_verify<0:
+                    raise Exception()
+            elif opt in ("-t","--time"):
+                arg_time = float(arg)
+                if arg_time<=0:
+                    raise Exception()
+            elif opt in ("-o","--output"):
+                arg_output = arg
+            elif opt == "--eval":
+                arg_eval = arg.lower()
+        except Exception:
+            print('Error: Invalid {} value "{}".'.format(opt, arg))
+            sys.exit(2)
+    if arg_output is None:
+        arg_output = defaultBookPath(arg_size)
+
+    try:
+        entries = buildBook(arg_size, arg_plies, arg_width, arg_depth, arg_verify, arg_eval, arg_time, sys.stderr)
+    except (ImportError, KeyError) as error:
+        print('Error: {}.'.format(error))
+        sys.exit(2)
+    writeBook(arg_output, arg_size, entries)
+    print("# wrote {} positions to {}".format(len(entries), arg_output))
+
+if __name__=="__main__":
+    main(sys.argv[1:])
@@ -11,25 +11,286 @@
 from __future__ import print_function
 
 import sys
+import json
 import time
 import getopt
 import random
 import copy
+import threading
+import multiprocessing
+
+from HexEvaluator import makeEvaluator, EVALUATORS
+from HexGeometry import boardGeometry, BitBoard, VALUE_EMPTY, VALUE_RED, VALUE_BLUE
+from HexMCTS import MCTSEngine
+from HexOpeningBook import OpeningBook, defaultBookPath
+from HexSolver import HexSolver
 
 # ======================================================================================
 # Constants
 # ======================================================================================
 ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 LETTER2INT = {ALPHABET[i]: i for i in range(26)}
-VALUE_EMPTY = 0
-VALUE_RED = 1  # from letter side to letter side
-VALUE_BLUE = -1  # from integer side to integer side
+WIN_SCORE = 10**9  # terminal score, larger than any heuristic value
+BOARD_TABLES = {}  # (board size, frontier radius) -> BoardTables, shared by every HexAgent
+ZOBRIST_TABLES = {}  # board size -> per cell (red key, blue key)
+ZOBRIST_SEED = 165  # fixed so hashes are stable across runs and processes
+TT_EXACT = 0
+TT_LOWER = 1  # score is a lower bound, the node failed high
+TT_UPPER = 2  # score is an upper bound, the node failed low
+TT_DEFAULT_SIZE = 1 << 18
+FIXED_DEPTH = 2  # search depth below the root move when no time budget is given
+FRONTIER_RADIUS = 2  # candidate moves lie within this many rows and columns of a stone
+DEFAULT_EVALUATOR = "twodistance"
+ROOT_WORKER = {}  # per process state of a parallel root search worker
+SOLVER_EMPTIES = 40  # most empty cells at which minimax tries to prove the game
+SOLVER_FILL = 0.4  # smaller boards are solved from this share of their cells on
+SOLVER_SHARE = 0.5  # share of the move time the solver may use
+SOLVER_TIME = 1.0  # solver budget in seconds when there is no move time
+ORDER_TT = 1 << 60  # move ordering priorities, history scores stay far below these
+ORDER_KILLER = 1 << 50
+ORDER_BRIDGE_SAVE = 1 << 20  # answer an intrusion into one of our bridges
+ORDER_BRIDGE_FORM = 1 << 10
+KILLERS_PER_PLY = 2
+PRUNE_DEPTH = 2  # inferior cells are pruned at the root and at nodes searched at least this deep
+SEARCHES = ("alphabeta", "pvs")
+PVS_WINDOW = 1e-6  # width of a null window, below the gap between two distinct scores
+ASPIRATION_SHARE = 0.25  # half width of the first aspiration window, relative to the last score
+ASPIRATION_MIN = 1e-3
+ASPIRATION_GROWTH = 4  # window widening after a failed aspiration search
+ASPIRATION_TRIES = 2  # failed windows before searching with a full window
+TIME_RESERVE = 0.05  # share of the game clock never planned for
+TIME_LATENCY = 0.05  # seconds per move lost to process startup, pipes and the referee
+TIME_GAME_FILL = 0.6  # share of the empty cells a game is expected to fill
+TIME_MIN_MOVES = 4  # the agent always plans for at least this many more moves
+TIME_MINIMUM = 0.05  # smallest budget for one move in seconds
+TIME_UNSTABLE_FACTOR = 2.0  # soft budget stretch while the best move keeps changing
+TIME_HARD_FACTOR = 4.0  # hard budget relative to the soft one
+TIME_HARD_SHARE = 0.25  # the hard budget never exceeds this share of the remaining clock
+NEIGHBOR_RING = ((-1, 0), (-1, 1), (0, 1), (1, 0), (1, -1), (0, -1))  # clockwise, consecutive cells touch
+BRIDGE_OFFSETS = ((-1, -1, (-1, 0), (0, -1)), (-2, 1, (-1, 0), (-1, 1)), (-1, 2, (-1, 1), (0, 1)),
+                  (1, 1, (0, 1), (1, 0)), (2, -1, (1, 0), (1, -1)), (1, -2, (1, -1), (0, -1)))
+
+class BoardTables:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize, radius):
+        # per cell tables indexed by i*boardSize + j, built once per board size on top of the
+        # shared geometry
+        self.boardSize = boardSize
+        self.radius = radius
+        self.geometry = boardGeometry(boardSize)
+        self.neighbors = self.buildNeighbors()
+        self.bridgeTemplates, self.ringTriples = self.buildBridgeTemplates()
+        self.deadRings = self.buildDeadRings()
+        self.frontierBoxes = self.buildFrontierBoxes()
+        # heuristicValue weights by a group's distance from its far and near edge
+        self.seedWeights = [boardSize/(boardSize - d) for d in range(boardSize)]
+        self.reachWeights = [1/(d+1) for d in range(boardSize)]
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def onBoard(self, move):
+        return 0 <= move[0] < self.boardSize and 0 <= move[1] < self.boardSize
+
+    def buildNeighbors(self):
+        # the geometry's neighbor cells with their coordinates, for the board indexing hot paths
+        size = self.boardSize
+        return [[(neighbor // size, neighbor % size, neighbor) for neighbor in cellNeighbors]
+                for cellNeighbors in self.geometry.neighbors]
+
+    def buildFrontierBoxes(self):
+        boxes = []
+        radius = self.radius
+        for i in range(self.boardSize):
+            for j in range(self.boardSize):
+                box = []
+                for bi in range(max(0, i-radius), min(self.boardSize, i+radius+1)):
+                    for bj in range(max(0, j-radius), min(self.boardSize, j+radius+1)):
+                        box.append((bi, bj, bi*self.boardSize + bj))
+                boxes.append(box)
+        return boxes
+
+    def buildBridgeTemplates(self):
+        # per cell: bridge partners with their two carriers, and neighbor pairs joined through one ring cell
+        bridgeTemplates = []
+        ringTriples = []
+        for i in range(self.boardSize):
+            for j in range(self.boardSize):
+                bridges = []
+                for (di, dj, carrierA, carrierB) in BRIDGE_OFFSETS:
+                    partner = (i+di, j+dj)
+                    first = (i+carrierA[0], j+carrierA[1])
+                    second = (i+carrierB[0], j+carrierB[1])
+                    if self.onBoard(partner) and self.onBoard(first) and self.onBoard(second):
+                        bridges.append((partner, first, second))
+                bridgeTemplates.append(bridges)
+                triples = []
+                ring = [(i+di, j+dj) for (di, dj) in NEIGHBOR_RING]
+                for k in range(6):
+                    first, carrier, second = ring[k], ring[(k+1) % 6], ring[(k+2) % 6]
+                    if self.onBoard(first) and self.onBoard(carrier) and self.onBoard(second):
+                        triples.append((first, carrier, second))
+                ringTriples.append(triples)
+        return bridgeTemplates, ringTriples
+
+    def buildDeadRings(self):
+        # per cell its six neighbors clockwise, off-board ones as the color owning that edge;
+        # the two cells touching both edges at once get None and are never called dead
+        deadRings = []
+        for i in range(self.boardSize):
+            for j in range(self.boardSize):
+                ring = []
+                for (di, dj) in NEIGHBOR_RING:
+                    ni = i + di
+                    nj = j + dj
+                    rowOff = (ni < 0 or ni >= self.boardSize)
+                    colOff = (nj < 0 or nj >= self.boardSize)
+                    if(rowOff and colOff):
+                        ring = None
+                        break
+                    elif(rowOff):
+                        ring.append(VALUE_BLUE)
+                    elif(colOff):
+                        ring.append(VALUE_RED)
+                    else:
+                        ring.append((ni, nj))
+                deadRings.append(ring)
+        return deadRings
+
+def solverEmpties(boardSize):
+    # an unproven position costs a solver budget per move, so small boards start late
+    return min(SOLVER_EMPTIES, int(boardSize*boardSize*SOLVER_FILL))
+
+def boardTables(boardSize, radius):
+    if (boardSize, radius) not in BOARD_TABLES:
+        BOARD_TABLES[(boardSize, radius)] = BoardTables(boardSize, radius)
+    return BOARD_TABLES[(boardSize, radius)]
+
+def parseMove(inp, boardSize):
+    # (i,j) for a "<row letter><column>" move on the board, None when malformed or off it
+    try:
+        i = LETTER2INT[inp[0]]
+        j = int(inp[1:])
+    except (KeyError, IndexError, ValueError):
+        return None
+    if i >= boardSize or j < 0 or j >= boardSize:
+        return None
+    return (i, j)
+
+class SearchTimeout(Exception):
+    # raised inside the search once the move's deadline has passed
+    pass
+
+def zobristKeys(boardSize):
+    if boardSize not in ZOBRIST_TABLES:
+        generator = random.Random(ZOBRIST_SEED * 100 + boardSize)
+        ZOBRIST_TABLES[boardSize] = [(generator.getrandbits(64), generator.getrandbits(64)) for x in range(boardSize*boardSize)]
+    return ZOBRIST_TABLES[boardSize]
+
+class TranspositionTable:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, size=TT_DEFAULT_SIZE):
+        # one entry per slot, size is rounded up to a power of two
+        slots = 1
+        while(slots < size):
+            slots <<= 1
+        self.mask = slots - 1
+        self.entries = [None] * slots
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def probe(self, key):
+        # entry is (key, depth, score, flag, bestMove, generation)
+        entry = self.entries[key & self.mask]
+        if(entry is not None and entry[0] == key):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, flag, bestMove):
+        # depth-preferred: keep a deeper result from the current search over a shallower one
+        slot = key & self.mask
+        entry = self.entries[slot]
+        if(entry is not None):
+            if(entry[5] == self.generation and entry[1] > depth):
+                return
+            if(entry[0] != key):
+                self.overwrites += 1
+        self.entries[slot] = (key, depth, score, flag, bestMove, self.generation)
+        self.stores += 1
+
+    def newSearch(self):
+        self.generation += 1
+
+    def hitRate(self):
+        probes = self.hits + self.misses
+        if(probes == 0):
+            return 0.0
+        return self.hits / probes
+
+    def clear(self):
+        self.entries = [None] * (self.mask + 1)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+class TimeManager:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, totalTime):
+        # the game clock in seconds, only the agent's own turns are counted against it
+        self.totalTime = totalTime
+        self.used = 0.0
+        self.moves = 0
+        self.turnStart = None
+        self.soft = 0.0
+        self.hard = 0.0
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def remaining(self):
+        return self.totalTime - self.used
+
+    def startMove(self, hexAgent):
+        # split what is left of the clock over the moves the agent still expects to make
+        self.turnStart = time.time()
+        available = self.remaining() - self.totalTime*TIME_RESERVE
+        movesLeft = max(TIME_MIN_MOVES, hexAgent.emptyCount * TIME_GAME_FILL / 2)
+        self.soft = max(TIME_MINIMUM, available / movesLeft - TIME_LATENCY)
+        self.hard = max(self.soft, min(self.soft * TIME_HARD_FACTOR, available * TIME_HARD_SHARE) - TIME_LATENCY)
+        hexAgent.moveTime = self.soft
+
+    def stopMove(self):
+        self.used += time.time() - self.turnStart
+        self.moves += 1
+
+    def nextDepth(self, elapsed, lastIteration, branching, changed):
+        # start another iteration only when it is expected to end within the soft budget,
+        # stretched while the best move is unstable; the hard budget still cuts it off
+        limit = self.soft
+        if(changed):
+            limit = min(self.soft * TIME_UNSTABLE_FACTOR, self.hard)
+        return elapsed + lastIteration * max(branching, 1.0) <= limit
 
 class HexAgent:
     # ======================================================================================
     # Constructor
     # ======================================================================================
-    def __init__(self, boardSize, color):
+    def __init__(self, boardSize, color, ttSize=TT_DEFAULT_SIZE, moveTime=None, radius=FRONTIER_RADIUS, evaluator=DEFAULT_EVALUATOR, workers=1, book=None, solve=None, search="alphabeta", bitboard=False):
         self.hexBoard = [[VALUE_EMPTY for j in range(boardSize)] for i in range(boardSize)]
         self.boardSize = boardSize
         self.color = color
@@ -37,6 +298,96 @@ class HexAgent:
         self.firstMove = True
         self.secondMove = False
 
+        # incremental disjoint-set over the cells, no path compression so every union
+        # can be undone in revertState
+        cells = boardSize*boardSize
+        self.ufParent = list(range(cells))
+        self.ufSize = [1 for x in range(cells)]
+        self.ufHistory = []
+        # per root (stones, minRow, maxRow, minCol, maxCol, liberty bits, seed order, seed move),
+        # the seed is the group's earliest stone; a group spanning its color's axis has won
+        self.emptyGroup = (0, boardSize, -1, boardSize, -1, 0, cells, None)
+        self.groupStats = [self.emptyGroup for x in range(cells)]
+        self.groupRoots = {VALUE_RED: set(), VALUE_BLUE: set()}
+        self.moveHistory = []
+        self.emptyCount = cells
+        self.winner = VALUE_EMPTY
+        self.tables = boardTables(boardSize, radius)
+        self.cellNeighbors = self.tables.neighbors
+        self.bridgeTemplates = self.tables.bridgeTemplates
+        self.ringTriples = self.tables.ringTriples
+        self.deadRings = self.tables.deadRings
+
+        # candidate frontier: empty cells with at least one stone of either color in range
+        self.frontierRadius = radius
+        self.frontierBoxes = self.tables.frontierBoxes
+        self.frontierCount = [0 for x in range(cells)]
+        self.frontier = set()
+
+        # move ordering state: killers per ply from the root, history per color
+        self.searchRootLength = 0
+        self.killerMoves = {}
+        self.historyTable = {VALUE_RED: {}, VALUE_BLUE: {}}
+        self.resetCounters()
+
+        # zobrist hash of hexBoard and of hexBoard turned 180 degrees, kept in step by recordMove/undoMove
+        self.zobrist = zobristKeys(boardSize)
+        self.hash = 0
+        self.mirrorHash = 0
+        self.symmetricMoves = 0
+        self.transpositionTable = TranspositionTable(ttSize)
+
+        # iterative deepening budget in seconds per move, None searches to fixedDepth; a clock
+        # sets it for every move and also decides when to stop deepening
+        self.moveTime = moveTime
+        self.clock = None
+        self.fixedDepth = FIXED_DEPTH
+        self.deadline = None
+        self.depthReached = 0
+        # score of the last finished root search, lower is better for the agent, None without one
+        self.rootScore = None
+        # "alphabeta" runs maxValue/minValue, "pvs" runs negamax with aspiration windows
+        if search not in SEARCHES:
+            raise ValueError("unknown search {}".format(search))
+        if(search == "pvs" and workers > 1):
+            # the root split runs maxValue/minValue in every worker
+            raise ValueError("pvs search runs in one process, it cannot use {} workers".format(workers))
+        self.searchMode = search
+
+        # set while pondering on the opponent's time, checkTime stops the search once it fires
+        self.stopEvent = None
+        self.ponderDepth = 0
+
+        # parallel root search: the pool and the shared best root score are created on first use
+        self.workers = workers
+        self.settings = (ttSize, None, radius, evaluator, bitboard)
+        self.rootPool = None
+        self.sharedBound = None
+
+        # leaf evaluator, None keeps the original heuristicValue
+        self.evaluator = makeEvaluator(evaluator, boardSize, color)
+        # a position and its 180 degree turn share table entries when the evaluator scores them alike
+        self.symmetric = self.evaluator is not None and self.evaluator.symmetric
+
+        # optional mask copy of hexBoard, kept by recordMove/undoMove for evaluators that
+        # score masks directly
+        self.bitBoard = None
+        if(bitboard):
+            self.bitBoard = BitBoard(boardSize)
+
+        # exact endgame solver, tried from solve empty cells on, 0 never solves, None scales
+        # with the board size
+        if(solve is None):
+            solve = solverEmpties(boardSize)
+        self.solverEmpties = solve
+        self.solver = None
+        self.solverResult = None
+
+        # opening book file keyed by the zobrist hash, None always searches
+        self.book = None
+        if(book is not None):
+            self.book = OpeningBook(book, boardSize)
+
     # ======================================================================================
     # Public Methods
     # ======================================================================================
@@ -85,6 +436,8 @@ class HexAgent:
                     board[pi][pj] = value
                     if(value == self.color):
                         self.playersMoves.append(move)
+                    if(board is self.hexBoard):
+                        self.recordMove(move, value)
                     return True
                 else:
                     raise Exception
@@ -119,39 +472,191 @@ class HexAgent:
                 print("---+",end="")
             print()
 
+    def print_search_stats(self):
+        # diagnostics go to stderr so stdout stays clean for the referee
+        table = self.transpositionTable
+        print("# depth: {}".format(self.depthReached), file=sys.stderr)
+        print("# ponder depth: {}".format(self.ponderDepth), file=sys.stderr)
+        print("# ordering: cutoffs={} first move cutoff rate={:.3f} moves per interior node={:.2f}".format(
+            self.cutoffs, self.cutoffRate(), self.branchingFactor()), file=sys.stderr)
+        if(self.searchMode == "pvs"):
+            print("# pvs: null window re-searches={} aspiration fails={}".format(
+                self.researches, self.aspirationFails), file=sys.stderr)
+        print("# pruning: checked={} pruned={} rate={:.3f}".format(
+            self.inferiorChecked, self.inferiorPruned, self.pruningRate()), file=sys.stderr)
+        print("# symmetry: root moves collapsed={} shared table={}".format(
+            self.symmetricMoves, self.symmetric), file=sys.stderr)
+        if(self.clock is not None):
+            print("# clock: used={:.2f}s remaining={:.2f}s soft={:.2f}s hard={:.2f}s".format(
+                self.clock.used, self.clock.remaining(), self.clock.soft, self.clock.hard), file=sys.stderr)
+        print("# tt: hits={} misses={} hit rate={:.3f} stores={} overwrites={}".format(
+            table.hits, table.misses, table.hitRate(), table.stores, table.overwrites), file=sys.stderr)
+
+    def searchStats(self, elapsed):
+        # one move's search statistics for --stats
+        nodes = self.nodes
+        return {
+            "engine": "minimax",
+            "nodes": nodes,
+            "leaves": self.leafEvaluations,
+            "cutoffs": self.cutoffs,
+            "depth": self.depthReached,
+            "time": round(elapsed, 4),
+            "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+            "branching": round(self.branchingFactor(), 2),
+            "solved": self.solverResult,
+            "pruned": round(self.pruningRate(), 3),
+            "search": self.searchMode,
+        }
+
     def minimax(self):
-        moves = []
+        started = time.time()
+        self.resetCounters()
+        self.depthReached = 0
+        self.rootScore = None
+        self.solverResult = None
+        move = self.bookMove()
+        if(move is not None):
+            self.firstMove = False
+            return move
         if(self.firstMove):
+            # out of book, take the center or the cell next to it
             self.firstMove = False
-            if(self.hexBoard[self.boardSize//2][self.boardSize//2] == VALUE_EMPTY):
-                return (self.boardSize//2, self.boardSize//2)
+            center = self.boardSize//2
+            if(self.hexBoard[center][center] == VALUE_EMPTY):
+                return (center, center)
+            elif(center + 1 < self.boardSize):
+                return (center, center + 1)
             else:
-                return(self.boardSize//2, self.boardSize//2 + 1)
-            if(self.color == VALUE_RED):
-                return (self.boardSize//2, 0)
-            else:
-                if(self.hexBoard[0][self.boardSize//2] == VALUE_EMPTY):
-                    return(0, self.boardSize//2)
-                else:
-                    return(0, 1+self.boardSize//2)
+                return self.getAvailableMoves(self.hexBoard)[0]
+        if(self.emptyCount <= self.solverEmpties):
+            move = self.solveEndgame()
+            if(move is not None):
+                return move
+
+        moves = self.getAdjacentMoves()
+        if(len(moves) == 0):
+            moves = self.getAvailableMoves(self.hexBoard)
+
+        self.transpositionTable.newSearch()
+        self.newSearch()
+        moves = self.pruneInferiorMoves(self.collapseSymmetricMoves(moves), self.color)
+        moves = self.orderMoves(moves, self.probeTable(), self.color)
+        if(self.moveTime is None):
+            self.depthReached = self.fixedDepth
+            bestMove, self.rootScore = self.searchDepth(moves, self.fixedDepth)
+            return bestMove
+
+        # iterative deepening, keeping the best move of the last finished depth
+        if(self.clock is not None):
+            self.deadline = started + self.clock.hard
         else:
-            moves = self.getAdjacentMoves()
+            self.deadline = started + self.moveTime
+        rootLength = self.searchRootLength
         bestMove = moves[0]
-        bestScore = float('inf')
-        alpha = float('-inf')
-        beta = float('inf')
-        depth = 2
-
-        for move in moves:
-            self.nextState(move, self.color)
-            score = self.maxValue(alpha, beta, depth)
-            if score < bestScore:
-                bestMove = move
-                bestScore = score
-            self.revertState(move)
+        self.depthReached = -1
+        scores = []
+        iterationNodes = 0
+        try:
+            for depth in range(self.emptyCount):
+                iterationStart = time.time()
+                nodesBefore = self.nodes
+                previousMove = bestMove
+                # scores swing between odd and even depths, so the aspiration window is centered
+                # on the last score with the same side making the final move
+                previous = None
+                if(len(scores) >= 2):
+                    previous = scores[-2]
+                bestMove, bestScore = self.searchDepth(moves, depth, previous)
+                scores.append(bestScore)
+                self.depthReached = depth
+                self.rootScore = bestScore
+                moves = [bestMove] + [move for move in moves if move != bestMove]
+                if(abs(bestScore) >= WIN_SCORE):
+                    # decided, a deeper search cannot change the outcome
+                    break
+                if(self.clock is not None):
+                    # the node growth of the last iteration predicts the cost of the next one
+                    now = time.time()
+                    branching = self.branchingFactor()
+                    if(iterationNodes > 0):
+                        branching = (self.nodes - nodesBefore) / iterationNodes
+                    iterationNodes = self.nodes - nodesBefore
+                    changed = (depth > 0 and bestMove != previousMove)
+                    if(not self.clock.nextDepth(now - started, now - iterationStart, branching, changed)):
+                        break
+        except SearchTimeout:
+            self.unwindSearch(rootLength)
+        self.deadline = None
 
         return bestMove
 
+    def ponder(self, stop):
+        # search the opponent's replies until stop is set, the results stay in the transposition
+        # table for the next minimax
+        self.ponderDepth = 0
+        if(self.winner != VALUE_EMPTY or len(self.frontier) == 0):
+            return
+        self.transpositionTable.newSearch()
+        self.newSearch()
+        self.stopEvent = stop
+        rootLength = len(self.moveHistory)
+        try:
+            for depth in range(1, self.emptyCount+1):
+                score = self.maxValue(float('-inf'), float('inf'), depth)
+                self.ponderDepth = depth
+                if(abs(score) >= WIN_SCORE):
+                    break
+        except SearchTimeout:
+            self.unwindSearch(rootLength)
+        self.stopEvent = None
+
+    def bookMove(self):
+        # the book answers a position or its 180 degree turn, None when neither is in it
+        if(self.book is None):
+            return None
+        move = self.book.lookup(self.hash)
+        if(move is None):
+            move = self.book.lookup(self.mirrorHash)
+            if(move is not None):
+                move = self.mirrorMove(move)
+        if(move is None or self.hexBoard[move[0]][move[1]] != VALUE_EMPTY):
+            return None
+        return move
+
+    def syncHistory(self, history):
+        # bring the board to a (move, color) sequence, keeping the common prefix in place
+        common = 0
+        while(common < len(history) and common < len(self.moveHistory)):
+            move, value = history[common]
+            if(self.moveHistory[common] != move or self.hexBoard[move[0]][move[1]] != value):
+                break
+            common += 1
+        self.unwindSearch(common)
+        for (move, value) in history[common:]:
+            self.nextState(move, value)
+
+    def clearSearch(self):
+        # forget everything earlier searches left behind so the next one depends only on the
+        # position; the evaluator is rebuilt because it may keep a playout generator, and the
+        # sets are rebuilt in sorted order because their iteration order breaks ordering ties
+        self.transpositionTable.clear()
+        self.historyTable = {VALUE_RED: {}, VALUE_BLUE: {}}
+        self.killerMoves = {}
+        self.solver = None
+        self.evaluator = makeEvaluator(self.settings[3], self.boardSize, self.color)
+        self.frontier = set(sorted(self.frontier))
+        for value in self.groupRoots:
+            self.groupRoots[value] = set(sorted(self.groupRoots[value]))
+
+    def close(self):
+        if(self.rootPool is not None):
+            self.rootPool.terminate()
+            self.rootPool = None
+        if(self.book is not None):
+            self.book.close()
+            self.book = None
+
     # ======================================================================================
     # Private Methods
     # ======================================================================================
@@ -168,136 +673,503 @@ class HexAgent:
             # could be type error or something
             return False
 
+    def solveEndgame(self):
+        # a proven win is played at once, a proven loss or an unfinished proof leaves it to the search
+        if(self.solver is None):
+            self.solver = HexSolver(self.boardSize, self.zobrist)
+        budget = SOLVER_TIME
+        if(self.moveTime is not None):
+            budget = self.moveTime * SOLVER_SHARE
+        self.solverResult, move = self.solver.solve(self.hexBoard, self.color, budget)
+        if(self.solverResult and move is not None):
+            self.depthReached = self.emptyCount
+            self.rootScore = -WIN_SCORE
+            return move
+        return None
+
+    def searchDepth(self, moves, depth, previous=None):
+        # pvs centers its aspiration window on previous, an earlier iteration's root score
+        if(self.searchMode == "pvs"):
+            return self.searchAspiration(moves, depth, previous)
+        if(self.workers <= 1 or len(moves) < 2):
+            return self.searchRoot(moves, depth)
+
+        # deal the ordered root moves round robin so every worker gets some strong candidates
+        if(self.rootPool is None):
+            self.sharedBound = multiprocessing.Value('d', float('inf'))
+            self.rootPool = multiprocessing.Pool(self.workers, initializer=initRootWorker,
+                                                 initargs=(self.sharedBound, self.boardSize, self.color, self.settings))
+        self.sharedBound.value = float('inf')
+        history = [(move, self.hexBoard[move[0]][move[1]]) for move in self.moveHistory]
+        tasks = [(history, moves[k::self.workers], depth, self.deadline) for k in range(min(self.workers, len(moves)))]
+        results = self.rootPool.map(searchRootMoves, tasks)
+        for result in results:
+            if result is not None:
+                self.addCounters(result[2])
+        if None in results:
+            raise SearchTimeout()
+
+        bestMove = moves[0]
+        bestScore = float('inf')
+        for move in moves:
+            for (chunkMove, chunkScore, counters) in results:
+                if(chunkMove == move and chunkScore < bestScore):
+                    bestMove = move
+                    bestScore = chunkScore
+        self.storeTable(depth+1, bestScore, TT_EXACT, bestMove)
+        return bestMove, bestScore
+
+    def searchRoot(self, moves, depth, sharedBound=None):
+        # root is the agent's move, each reply is searched with the best score so far as beta,
+        # tightened by the best score any other worker has found when sharedBound is given
+        bestMove = moves[0]
+        bestScore = float('inf')
+        alpha = float('-inf')
+
+        for move in moves:
+            beta = bestScore
+            if(sharedBound is not None and sharedBound.value < beta):
+                beta = sharedBound.value
+            self.nextState(move, self.color)
+            score = self.maxValue(alpha, beta, depth)
+            if score < bestScore:
+                bestMove = move
+                bestScore = score
+                if(sharedBound is not None):
+                    with sharedBound.get_lock():
+                        if(score < sharedBound.value):
+                            sharedBound.value = score
+            self.revertState(move)
+
+        if(sharedBound is None):
+            self.storeTable(depth+1, bestScore, TT_EXACT, bestMove)
+        return bestMove, bestScore
+
+    def unwindSearch(self, length):
+        while(len(self.moveHistory) > length):
+            self.revertState(self.moveHistory[-1])
+
+    def checkTime(self):
+        if(self.deadline is not None and time.time() > self.deadline):
+            raise SearchTimeout()
+        if(self.stopEvent is not None and self.stopEvent.is_set()):
+            raise SearchTimeout()
+
     def maxValue(self, alpha, beta, depth):
+        self.checkTime()
+        self.nodes += 1
+        if(self.winner != VALUE_EMPTY):
+            return self.terminalValue(depth)
         if(depth == 0 or self.gameOver(self.hexBoard)):
-            return self.heuristicValue(self.hexBoard)
+            return self.leafValue()
 
-        moves = self.getAdjacentMoves()
+        entry = self.probeTable()
+        if(entry is not None and entry[1] >= depth):
+            if(entry[3] == TT_EXACT or (entry[3] == TT_LOWER and entry[2] >= beta) or (entry[3] == TT_UPPER and entry[2] <= alpha)):
+                return entry[2]
+        alphaOrig = alpha
+
+        if(self.color == VALUE_RED):
+            value = VALUE_BLUE
+        else:
+            value = VALUE_RED
+        moves = self.orderMoves(self.candidateMoves(value, depth), entry, value)
         bestScore = float('-inf')
+        bestMove = None
+        self.interiorNodes += 1
+        if(self.batchedLeaves(depth)):
+            scores = self.leafChildScores(moves, value)
+            bestScore = max(scores)
+            bestMove = moves[scores.index(bestScore)]
+            self.storeTable(depth, bestScore, TT_EXACT, bestMove)
+            return bestScore
 
-        for move in moves:
-            if(self.color == VALUE_RED):
-                self.nextState(move, VALUE_BLUE)
-            else:
-                self.nextState(move, VALUE_RED)
+        for index, move in enumerate(moves):
+            self.nextState(move, value)
             score = self.minValue(alpha, beta, depth-1)
             if score > bestScore:
                 bestScore = score
+                bestMove = move
             if score >= beta:
                 self.revertState(move)
+                self.recordCutoff(move, value, depth, index)
+                self.storeTable(depth, bestScore, TT_LOWER, bestMove)
                 return bestScore
             if score > alpha:
                 alpha = score
             self.revertState(move)
 
+        self.movesSearched += len(moves)
+        if(bestScore <= alphaOrig):
+            self.storeTable(depth, bestScore, TT_UPPER, bestMove)
+        else:
+            self.storeTable(depth, bestScore, TT_EXACT, bestMove)
         return bestScore
 
     def minValue(self, alpha, beta, depth):
+        self.checkTime()
+        self.nodes += 1
+        if(self.winner != VALUE_EMPTY):
+            return self.terminalValue(depth)
         if(depth == 0 or self.gameOver(self.hexBoard)):
-            return self.heuristicValue(self.hexBoard)
+            return self.leafValue()
 
-        moves = self.getAdjacentMoves()
+        entry = self.probeTable()
+        if(entry is not None and entry[1] >= depth):
+            if(entry[3] == TT_EXACT or (entry[3] == TT_LOWER and entry[2] >= beta) or (entry[3] == TT_UPPER and entry[2] <= alpha)):
+                return entry[2]
+        betaOrig = beta
+
+        moves = self.orderMoves(self.candidateMoves(self.color, depth), entry, self.color)
         bestScore = float('inf')
+        bestMove = None
+        self.interiorNodes += 1
+        if(self.batchedLeaves(depth)):
+            scores = self.leafChildScores(moves, self.color)
+            bestScore = min(scores)
+            bestMove = moves[scores.index(bestScore)]
+            self.storeTable(depth, bestScore, TT_EXACT, bestMove)
+            return bestScore
 
-        for move in moves:
+        for index, move in enumerate(moves):
             self.nextState(move, self.color)
             score = self.maxValue(alpha, beta, depth-1)
 
             if score < bestScore:
                 bestScore = score
+                bestMove = move
             if score <= alpha:
                 self.revertState(move)
+                self.recordCutoff(move, self.color, depth, index)
+                self.storeTable(depth, bestScore, TT_UPPER, bestMove)
                 return bestScore
             if score < beta:
                 beta = score
             self.revertState(move)
 
+        self.movesSearched += len(moves)
+        if(bestScore >= betaOrig):
+            self.storeTable(depth, bestScore, TT_LOWER, bestMove)
+        else:
+            self.storeTable(depth, bestScore, TT_EXACT, bestMove)
         return bestScore
 
+    def searchAspiration(self, moves, depth, previous):
+        # negamax scores are the agent's scores negated, the window starts around the last one
+        # and only the side that failed widens, until a full window search
+        if(previous is None or abs(previous) >= WIN_SCORE):
+            bestMove, bestValue = self.searchRootPVS(moves, depth, float('-inf'), float('inf'))
+            self.storeTable(depth+1, -bestValue, TT_EXACT, bestMove)
+            return bestMove, -bestValue
+        delta = max(abs(previous) * ASPIRATION_SHARE, ASPIRATION_MIN)
+        alpha = -previous - delta
+        beta = -previous + delta
+        for attempt in range(ASPIRATION_TRIES):
+            bestMove, bestValue = self.searchRootPVS(moves, depth, alpha, beta)
+            if(alpha < bestValue < beta):
+                self.storeTable(depth+1, -bestValue, TT_EXACT, bestMove)
+                return bestMove, -bestValue
+            self.aspirationFails += 1
+            delta *= ASPIRATION_GROWTH
+            if(bestValue <= alpha):
+                alpha = -previous - delta
+            else:
+                # the move that failed high is searched first next time
+                beta = -previous + delta
+                moves = [bestMove] + [move for move in moves if move != bestMove]
+        return self.searchAspiration(moves, depth, None)
+
+    def searchRootPVS(self, moves, depth, alpha, beta):
+        # the first root move gets the full window, the others a null window around the best
+        bestMove = moves[0]
+        bestValue = float('-inf')
+        opponent = -self.color
+        for index, move in enumerate(moves):
+            self.nextState(move, self.color)
+            if(index == 0):
+                value = -self.negamax(-beta, -alpha, depth, opponent)
+            else:
+                value = -self.negamax(-alpha - PVS_WINDOW, -alpha, depth, opponent)
+                if(alpha < value < beta):
+                    # the scout's fail high is a lower bound, so the re-search starts from it
+                    self.researches += 1
+                    value = -self.negamax(-beta, -value, depth, opponent)
+            self.revertState(move)
+            if value > bestValue:
+                bestMove = move
+                bestValue = value
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+        return bestMove, bestValue
+
+    def negamax(self, alpha, beta, depth, value):
+        # maxValue and minValue in one, scores are from the side to move; sign turns the agent's
+        # scores, which the table and the evaluators use, into the mover's and back
+        self.checkTime()
+        self.nodes += 1
+        if(value == self.color):
+            sign = -1
+        else:
+            sign = 1
+        if(self.winner != VALUE_EMPTY):
+            return sign * self.terminalValue(depth)
+        if(depth == 0 or self.gameOver(self.hexBoard)):
+            return sign * self.leafValue()
+
+        entry = self.probeTable()
+        if(entry is not None and entry[1] >= depth):
+            score = sign * entry[2]
+            flag = entry[3]
+            if(sign < 0 and flag != TT_EXACT):
+                flag = TT_LOWER + TT_UPPER - flag
+            if(flag == TT_EXACT or (flag == TT_LOWER and score >= beta) or (flag == TT_UPPER and score <= alpha)):
+                return score
+        alphaOrig = alpha
+
+        moves = self.orderMoves(self.candidateMoves(value, depth), entry, value)
+        bestScore = float('-inf')
+        bestMove = None
+        self.interiorNodes += 1
+        if(self.batchedLeaves(depth)):
+            scores = [sign * score for score in self.leafChildScores(moves, value)]
+            bestScore = max(scores)
+            bestMove = moves[scores.index(bestScore)]
+            self.storeNegamax(depth, bestScore, TT_EXACT, bestMove, sign)
+            return bestScore
+
+        for index, move in enumerate(moves):
+            self.nextState(move, value)
+            if(index == 0):
+                score = -self.negamax(-beta, -alpha, depth-1, -value)
+            else:
+                score = -self.negamax(-alpha - PVS_WINDOW, -alpha, depth-1, -value)
+                if(alpha < score < beta):
+                    self.researches += 1
+                    score = -self.negamax(-beta, -score, depth-1, -value)
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+            if score >= beta:
+                self.revertState(move)
+                self.recordCutoff(move, value, depth, index)
+                self.storeNegamax(depth, bestScore, TT_LOWER, bestMove, sign)
+                return bestScore
+            if score > alpha:
+                alpha = score
+            self.revertState(move)
+
+        self.movesSearched += len(moves)
+        if(bestScore <= alphaOrig):
+            self.storeNegamax(depth, bestScore, TT_UPPER, bestMove, sign)
+        else:
+            self.storeNegamax(depth, bestScore, TT_EXACT, bestMove, sign)
+        return bestScore
+
+    def storeNegamax(self, depth, score, flag, bestMove, sign):
+        # back to the agent's side: the score turns and a lower bound becomes an upper one
+        if(sign < 0 and flag != TT_EXACT):
+            flag = TT_LOWER + TT_UPPER - flag
+        self.storeTable(depth, sign * score, flag, bestMove)
+
+    def leafValue(self):
+        # heuristic scores are cached as depth 0 entries
+        entry = self.probeTable()
+        if(entry is not None and entry[1] == 0):
+            return entry[2]
+        value = self.evaluatePosition()
+        self.leafEvaluations += 1
+        self.storeTable(0, value, TT_EXACT, None)
+        return value
+
+    def evaluatePosition(self):
+        if(self.evaluator is None):
+            return self.heuristicValue(self.hexBoard)
+        if(self.bitBoard is not None and self.evaluator.bitwise):
+            return self.evaluator.evaluateBits(self.bitBoard)
+        return self.evaluator.evaluate(self.hexBoard)
+
+    def batchedLeaves(self, depth):
+        return (depth == 1 and self.evaluator is not None and self.evaluator.batched)
+
+    def leafChildScores(self, moves, value):
+        # score every child of a depth 1 node, evaluating the undecided ones in one batch
+        scores = [None] * len(moves)
+        pending = []
+        boards = []
+        for index, move in enumerate(moves):
+            self.nextState(move, value)
+            entry = self.probeTable()
+            if(self.winner != VALUE_EMPTY):
+                scores[index] = self.terminalValue(0)
+            elif(entry is not None and entry[1] == 0):
+                scores[index] = entry[2]
+            else:
+                pending.append((index, self.tableKey()))
+                boards.append([row[:] for row in self.hexBoard])
+            self.revertState(move)
+
+        if(len(boards) > 0):
+            self.leafEvaluations += len(boards)
+            for (index, key), score in zip(pending, self.evaluator.evaluateBatch(boards)):
+                scores[index] = score
+                self.transpositionTable.store(key, 0, score, TT_EXACT, None)
+        self.movesSearched += len(moves)
+        return scores
+
+    def newSearch(self):
+        # killers are position specific, history carries over at half weight
+        self.searchRootLength = len(self.moveHistory)
+        self.killerMoves = {}
+        for value in self.historyTable:
+            table = self.historyTable[value]
+            for move in list(table):
+                table[move] //= 2
+                if(table[move] == 0):
+                    del table[move]
+        self.resetCounters()
+
+    def counters(self):
+        return (self.nodes, self.leafEvaluations, self.interiorNodes, self.movesSearched, self.cutoffs, self.firstMoveCutoffs,
+                self.inferiorChecked, self.inferiorPruned)
+
+    def addCounters(self, counters):
+        nodes, leafEvaluations, interiorNodes, movesSearched, cutoffs, firstMoveCutoffs, inferiorChecked, inferiorPruned = counters
+        self.inferiorChecked += inferiorChecked
+        self.inferiorPruned += inferiorPruned
+        self.nodes += nodes
+        self.leafEvaluations += leafEvaluations
+        self.interiorNodes += interiorNodes
+        self.movesSearched += movesSearched
+        self.cutoffs += cutoffs
+        self.firstMoveCutoffs += firstMoveCutoffs
+
+    def resetCounters(self):
+        # per search statistics, nodes are maxValue/minValue calls
+        self.nodes = 0
+        self.leafEvaluations = 0
+        self.interiorNodes = 0
+        self.movesSearched = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.inferiorChecked = 0
+        self.inferiorPruned = 0
+        self.researches = 0
+        self.aspirationFails = 0
+
+    def orderMoves(self, moves, entry, value):
+        # tt best move, then killers of this ply, then history plus bridge features
+        ttMove = None
+        if(entry is not None):
+            ttMove = entry[4]
+        killers = self.killerMoves.get(len(self.moveHistory) - self.searchRootLength, ())
+        history = self.historyTable[value]
+
+        priorities = {}
+        for move in moves:
+            if(move == ttMove):
+                priorities[move] = ORDER_TT
+            elif(move in killers):
+                priorities[move] = ORDER_KILLER - killers.index(move)
+            else:
+                priorities[move] = history.get(move, 0) + self.bridgeScore(move, value)
+
+        return sorted(moves, key=lambda move: -priorities[move])
+
+    def recordCutoff(self, move, value, depth, index):
+        self.cutoffs += 1
+        self.movesSearched += index + 1
+        if(index == 0):
+            self.firstMoveCutoffs += 1
+        ply = len(self.moveHistory) - self.searchRootLength
+        killers = self.killerMoves.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_PLY:]
+        history = self.historyTable[value]
+        history[move] = history.get(move, 0) + depth*depth
+
+    def bridgeScore(self, move, value):
+        board = self.hexBoard
+        score = 0
+        node = move[0]*self.boardSize + move[1]
+        # move is the free carrier of a bridge the opponent has intruded into
+        for (first, carrier, second) in self.ringTriples[node]:
+            if(board[first[0]][first[1]] == value and board[second[0]][second[1]] == value and board[carrier[0]][carrier[1]] == -value):
+                score += ORDER_BRIDGE_SAVE
+        # move makes a fresh bridge with one of our stones
+        for (partner, carrierA, carrierB) in self.bridgeTemplates[node]:
+            if(board[partner[0]][partner[1]] == value and board[carrierA[0]][carrierA[1]] == VALUE_EMPTY and board[carrierB[0]][carrierB[1]] == VALUE_EMPTY):
+                score += ORDER_BRIDGE_FORM
+        return score
+
+    def cutoffRate(self):
+        if(self.cutoffs == 0):
+            return 0.0
+        return self.firstMoveCutoffs / self.cutoffs
+
+    def pruningRate(self):
+        if(self.inferiorChecked == 0):
+            return 0.0
+        return self.inferiorPruned / self.inferiorChecked
+
+    def branchingFactor(self):
+        if(self.interiorNodes == 0):
+            return 0.0
+        return self.movesSearched / self.interiorNodes
+
     def heuristicValue(self, currentState):
-        visitedPositions = {}
+        # group terms come from the statistics kept by connectStone, one pass over our groups
         value = 1
-
-        lowerLimit = 0
         upperLimit = 0
-        
-        for move in self.playersMoves:
-            
-            if move not in visitedPositions:
-                lowerLimit = 0
-                upperLimit = 0
-                numberOfConnectedNodes = 0
-                direction = 0
-
-                if(self.color == VALUE_BLUE):
-                    lowerLimit = move[0]
-                    upperLimit = move[0]
-                    numberOfConnectedNodes = 1
-                    direction = move[0]
-                else:
-                    lowerLimit = move[1]
-                    upperLimit = move[1]
-                    numberOfConnectedNodes = 1
-                    direction = move[1]
-
-                distance = [lowerLimit, upperLimit, numberOfConnectedNodes]
-                
-                numberOfConnectedNodes += self.numberOfConnections(move, distance, visitedPositions)
-        
-                lowerLimit = distance[0]
-                upperLimit = distance[1]
-                numberOfConnectedNodes = distance[2]
-                
-                value += (3*numberOfConnectedNodes) * (self.boardSize/(((self.boardSize - direction)))) * (1/(lowerLimit+1))
-        #self.print_board()
-        #print(str(value))
+        lastSeed = -1
+        seedWeights = self.tables.seedWeights
+        reachWeights = self.tables.reachWeights
+
+        for root in self.groupRoots[self.color]:
+            numberOfConnectedNodes, minRow, maxRow, minCol, maxCol, liberties, seedOrder, seedMove = self.groupStats[root]
+            if(self.color == VALUE_BLUE):
+                lowerLimit = minRow
+                groupUpper = maxRow
+                direction = seedMove[0]
+            else:
+                lowerLimit = minCol
+                groupUpper = maxCol
+                direction = seedMove[1]
+
+            value += (3*numberOfConnectedNodes) * seedWeights[direction] * reachWeights[lowerLimit]
+            # the group whose first stone was played last sets the multiplier
+            if(seedOrder > lastSeed):
+                lastSeed = seedOrder
+                upperLimit = groupUpper
         value *=  ((upperLimit+1))
 
         return value
 
     def numberOfConnections(self, move, distance, visitedPositions):
-        i = move[0]
-        j = move[1]
-        connections = 1
+        # size of move's group, widening distance to the group's extent along our axis
         if(move in visitedPositions):
-            return connections
+            return 0
 
         visitedPositions[move] = True
-
-        #node = (i-1, j)
-        if((i-1) >= 0 and self.hexBoard[i-1][j] == self.color):
-            if(self.color == VALUE_RED and i-1 < distance[0]):
-                distance[0] = i-1
-            connections += 1 + self.numberOfConnections((i-1,j), distance, visitedPositions)
-        #node = (i+1, j)
-        if((i+1) < self.boardSize and self.hexBoard[i+1][j] == self.color):
-            if(self.color == VALUE_RED and (i+1) > distance[1]):
-                distance[1] = (i+1)
-            connections += 1 + self.numberOfConnections((i+1,j), distance, visitedPositions)
-        #node = (i, j-1)
-        if((j-1) >= 0 and self.hexBoard[i][j-1] == self.color):
-            if(self.color == VALUE_BLUE and j-1 < distance[0]):
-                distance[0] = j-1
-            connections += 1 + self.numberOfConnections((i,j-1), distance, visitedPositions)
-        #node = (i, j+1)
-        if((j+1) < self.boardSize and self.hexBoard[i][j+1] == self.color):
-            if(self.color == VALUE_BLUE and (j+1) > distance[1]):
-                distance[1] = (j+1)
-            connections += 1 + self.numberOfConnections((i,j+1), distance, visitedPositions)
-        #node = (i+1, j-1)
-        if(j-1 >= 0 and i+1 < self.boardSize and self.hexBoard[i+1][j-1] == self.color):
-            if(self.color == VALUE_RED and (i+1) > distance[1]):
-                distance[1] = (i+1)
-            if(self.color == VALUE_BLUE and (j-1) < distance[0]):
-                distance[0] = j-1
-            connections += 1 + self.numberOfConnections((i+1,j-1), distance, visitedPositions)
-        #node = (i-1, j+1)
-        if((j+1) < self.boardSize and (i-1) >= 0 and self.hexBoard[i-1][j+1] == self.color):
-            if(self.color == VALUE_RED and (i-1) < distance[0]):
-                distance[0] = i-1
-            if(self.color == VALUE_BLUE and (j+1) > distance[0]):
-                distance[1] = (j+1)
-            connections += 1 + self.numberOfConnections((i-1,j+1), distance, visitedPositions)
+        stack = [move]
+        connections = 0
+        while(stack):
+            (i, j) = stack.pop()
+            connections += 1
+            if(self.color == VALUE_BLUE):
+                axis = i
+            else:
+                axis = j
+            if(axis < distance[0]):
+                distance[0] = axis
+            if(axis > distance[1]):
+                distance[1] = axis
+            for (ni, nj, neighbor) in self.cellNeighbors[i*self.boardSize + j]:
+                if(self.hexBoard[ni][nj] == self.color and (ni, nj) not in visitedPositions):
+                    visitedPositions[(ni, nj)] = True
+                    stack.append((ni, nj))
 
         return connections
 
@@ -312,58 +1184,92 @@ class HexAgent:
         return availableMoves
 
     def getAdjacentMoves(self):
-        adjacentMoves = []
-        radius = 2
-        playersMoves = self.getPlayersMoves(self.hexBoard)
-        for playerMove in playersMoves:
-            for i in range(self.boardSize):
-                for j in range(self.boardSize):
-                    if self.hexBoard[i][j] == VALUE_EMPTY and self.inIRangeOf(i, playerMove, radius) and self.inJRangeOf(j, playerMove, radius):
-                        #if(self.deadOrVulnerableMove((i,j))):
-                        adjacentMoves.append((i,j))
-
-        return adjacentMoves
-    def deadOrVulnerableMove(self, move):
-        i = move[0]
-        j = move[1]
-
-        count = 0
-        if(self.check_pos((i-1, j))):
-            if(self.hexBoard[i-1][j] == VALUE_EMPTY):
-                count += 1
-        
-        if(self.check_pos((i+1, j))):
-            if(self.hexBoard[i+1][j] == VALUE_EMPTY):
-                count += 1
-
-        if(self.check_pos((i, j -1))):
-            if(self.hexBoard[i][j-1] == VALUE_EMPTY):
-                count += 1
-
-        if(self.check_pos((i, j+1))):
-            if(self.hexBoard[i][j+1] == VALUE_EMPTY):
-                count += 1
-
-        if(self.check_pos((i+1, j-1))):
-            if(self.hexBoard[i+1][j-1]):
-                count += 1
-
-        if(self.check_pos((i-1, j+1))):
-            if(self.hexBoard[i-1][j-1]):
-                count += 1
-
-        return count != 6
-    def inIRangeOf(self, i, playerMove, radius):
-        lowerLimit = playerMove[0] - radius
-        upperLimit = playerMove[0] + radius
-
-        return(lowerLimit <= i and i <= upperLimit)
-    def inJRangeOf(self, j, playerMove, radius):
-        lowerLimit = playerMove[1] - radius
-        upperLimit = playerMove[1] + radius
-
-        return(lowerLimit <= j and j <= upperLimit)
+        # empty cells within radius of any stone, kept up to date by recordMove/undoMove
+        return list(self.frontier)
+
+    def candidateMoves(self, value, depth):
+        moves = self.getAdjacentMoves()
+        if(depth >= PRUNE_DEPTH):
+            moves = self.pruneInferiorMoves(moves, value)
+        return moves
+
+    def pruneInferiorMoves(self, moves, value):
+        # drops dead cells, cells of a captured pair and cells an opponent reply kills, the
+        # last only while the cell value would answer with stays a candidate
+        kept = []
+        killers = {}
+        for move in moves:
+            (i, j) = move
+            if(self.isDead(i, j) or self.isCaptured(i, j, value)):
+                continue
+            killer = self.killerOf(i, j, value)
+            if(killer is not None):
+                killers[move] = killer
+            kept.append(move)
+        if(killers):
+            candidates = set(kept)
+            for move in killers:
+                if(killers[move] in candidates and killers.get(killers[move]) != move):
+                    candidates.discard(move)
+            kept = [move for move in kept if move in candidates]
+        self.inferiorChecked += len(moves)
+        if(len(kept) == 0):
+            return moves
+        self.inferiorPruned += len(moves) - len(kept)
+        return kept
+
+    def isDead(self, i, j, placed=None):
+        # no completion of the board lets either color need this cell
+        ring = self.deadRings[i*self.boardSize + j]
+        if(ring is None):
+            return False
+        colors = []
+        for entry in ring:
+            if(type(entry) is int):
+                colors.append(entry)
+            elif(placed is not None and entry in placed):
+                colors.append(placed[entry])
+            else:
+                colors.append(self.hexBoard[entry[0]][entry[1]])
+        return self.uselessFor(colors, VALUE_RED) and self.uselessFor(colors, VALUE_BLUE)
+
+    def uselessFor(self, colors, value):
+        # two value cells of the ring are joined around the ring whatever fills its empty
+        # cells: the cells value could own form one arc with empty cells only at its ends
+        possible = [color != -value for color in colors]
+        count = possible.count(True)
+        if(count <= 1):
+            return True
+        empty = [k for k in range(6) if colors[k] == VALUE_EMPTY]
+        if(count == 6):
+            return len(empty) <= 1 or (len(empty) == 2 and (empty[1] - empty[0]) in (1, 5))
+        starts = [k for k in range(6) if possible[k] and not possible[k-1]]
+        if(len(starts) != 1):
+            return False
+        for t in range(1, count-1):
+            if(colors[(starts[0] + t) % 6] != value):
+                return False
+        return True
+
+    def killerOf(self, i, j, value):
+        # an empty neighbor where the opponent's reply leaves value's stone at (i,j) dead
+        for (ni, nj, neighbor) in self.cellNeighbors[i*self.boardSize + j]:
+            if(self.hexBoard[ni][nj] == VALUE_EMPTY):
+                if(self.isDead(i, j, {(i, j): value, (ni, nj): -value})):
+                    return (ni, nj)
+        return None
 
+    def isCaptured(self, i, j, value):
+        # part of an adjacent empty pair one color can always answer inside, leaving the
+        # other color's stone dead; filling it is a wasted move for either side
+        for (ni, nj, neighbor) in self.cellNeighbors[i*self.boardSize + j]:
+            if(self.hexBoard[ni][nj] != VALUE_EMPTY):
+                continue
+            for owner in (value, -value):
+                if(self.isDead(i, j, {(i, j): -owner, (ni, nj): owner}) and
+                   self.isDead(ni, nj, {(ni, nj): -owner, (i, j): owner})):
+                    return True
+        return False
 
     def getPlayersMoves(self, currentState):
         playerMoves = []
@@ -376,35 +1282,293 @@ class HexAgent:
         return playerMoves
 
     def nextState(self, move, value):
-        self.update_board(self.hexBoard, move, value)
+        # search moves are empty cells on the board, update_board validates outside input
+        self.hexBoard[move[0]][move[1]] = value
+        if(value == self.color):
+            self.playersMoves.append(move)
+        self.recordMove(move, value)
 
     def revertState(self, move):
+        value = self.hexBoard[move[0]][move[1]]
+        if(value == self.color):
+            del self.playersMoves[-1]
+        self.hexBoard[move[0]][move[1]] = VALUE_EMPTY
+        self.undoMove(move, value)
+
+    def gameOver(self, currentState):
+        return (self.winner != VALUE_EMPTY or self.emptyCount == 0)
+
+    def terminalValue(self, depth):
+        # the search minimizes from the agent's side, quicker wins score better
+        if(self.winner == self.color):
+            return -(WIN_SCORE + depth)
+        return WIN_SCORE + depth
+
+    def find(self, node):
+        while(self.ufParent[node] != node):
+            node = self.ufParent[node]
+        return node
+
+    def union(self, a, b, value, links):
+        rootA = self.find(a)
+        rootB = self.find(b)
+        if(rootA == rootB):
+            return
+        if(self.ufSize[rootA] < self.ufSize[rootB]):
+            rootA, rootB = rootB, rootA
+        self.ufParent[rootB] = rootA
+        self.ufSize[rootA] += self.ufSize[rootB]
+        statsA = self.groupStats[rootA]
+        statsB = self.groupStats[rootB]
+        if(statsB[6] < statsA[6]):
+            seed = statsB[6:]
+        else:
+            seed = statsA[6:]
+        self.groupStats[rootA] = (statsA[0] + statsB[0], min(statsA[1], statsB[1]), max(statsA[2], statsB[2]),
+                                  min(statsA[3], statsB[3]), max(statsA[4], statsB[4]), statsA[5] | statsB[5]) + seed
+        roots = self.groupRoots[value]
+        roots.discard(rootB)
+        links.append((rootB, rootA, statsA))
+
+    def recordMove(self, move, value):
+        # keep every incremental structure in step with a stone placed on hexBoard
+        self.connectStone(move, value)
+        self.extendFrontier(move)
+        self.hash ^= self.zobristKey(move, value)
+        self.mirrorHash ^= self.zobristKey(self.mirrorMove(move), value)
+        if(self.bitBoard is not None):
+            self.bitBoard.place(move, value)
+
+    def undoMove(self, move, value):
+        self.disconnectStone()
+        self.shrinkFrontier(move)
+        self.hash ^= self.zobristKey(move, value)
+        self.mirrorHash ^= self.zobristKey(self.mirrorMove(move), value)
+        if(self.bitBoard is not None):
+            self.bitBoard.remove(move)
+
+    def extendFrontier(self, move):
+        self.frontier.discard(move)
+        for (i, j, node) in self.frontierBoxes[move[0]*self.boardSize + move[1]]:
+            self.frontierCount[node] += 1
+            if(self.frontierCount[node] == 1 and self.hexBoard[i][j] == VALUE_EMPTY):
+                self.frontier.add((i, j))
+
+    def shrinkFrontier(self, move):
+        for (i, j, node) in self.frontierBoxes[move[0]*self.boardSize + move[1]]:
+            self.frontierCount[node] -= 1
+            if(self.frontierCount[node] == 0):
+                self.frontier.discard((i, j))
+        if(self.frontierCount[move[0]*self.boardSize + move[1]] > 0):
+            self.frontier.add(move)
+
+    def mirrorMove(self, move):
+        # the cell move lands on when the board is turned 180 degrees, both colors keep their edges
+        return (self.boardSize-1 - move[0], self.boardSize-1 - move[1])
+
+    def isSymmetric(self):
+        for move in self.moveHistory:
+            mirror = self.mirrorMove(move)
+            if(self.hexBoard[mirror[0]][mirror[1]] != self.hexBoard[move[0]][move[1]]):
+                return False
+        return True
+
+    def collapseSymmetricMoves(self, moves):
+        # on a position equal to its own turn a move and its mirror lead to equivalent games
+        self.symmetricMoves = 0
+        if(not self.isSymmetric()):
+            return moves
+        kept = set()
+        for move in moves:
+            if(self.mirrorMove(move) not in kept):
+                kept.add(move)
+        self.symmetricMoves = len(moves) - len(kept)
+        return [move for move in moves if move in kept]
+
+    def tableKey(self):
+        # the smaller of the two hashes is the canonical key of the position
+        if(self.symmetric and self.mirrorHash < self.hash):
+            return self.mirrorHash
+        return self.hash
+
+    def probeTable(self):
+        # best moves are stored for the canonical board and turned back for this one
+        if(self.symmetric and self.mirrorHash < self.hash):
+            entry = self.transpositionTable.probe(self.mirrorHash)
+            if(entry is not None and entry[4] is not None):
+                entry = entry[:4] + (self.mirrorMove(entry[4]),) + entry[5:]
+            return entry
+        return self.transpositionTable.probe(self.hash)
+
+    def storeTable(self, depth, score, flag, bestMove):
+        if(self.symmetric and self.mirrorHash < self.hash):
+            if(bestMove is not None):
+                bestMove = self.mirrorMove(bestMove)
+            self.transpositionTable.store(self.mirrorHash, depth, score, flag, bestMove)
+        else:
+            self.transpositionTable.store(self.hash, depth, score, flag, bestMove)
+
+    def zobristKey(self, move, value):
+        keys = self.zobrist[move[0]*self.boardSize + move[1]]
+        if(value == VALUE_RED):
+            return keys[0]
+        return keys[1]
+
+    def connectStone(self, move, value):
         pi = move[0]
         pj = move[1]
+        node = pi*self.boardSize + pj
+        bit = 1 << node
 
-        if self.check_pos(move):
-            if(self.hexBoard[pi][pj] == self.color):
-                del self.playersMoves[-1]
-            self.hexBoard[pi][pj] = VALUE_EMPTY
+        # the new stone fills a liberty of every group around it
+        liberties = 0
+        touched = []
+        for (ni, nj, neighbor) in self.cellNeighbors[node]:
+            if(self.hexBoard[ni][nj] == VALUE_EMPTY):
+                liberties |= 1 << neighbor
+            else:
+                root = self.find(neighbor)
+                if root not in touched:
+                    touched.append(root)
+        changes = []
+        for root in touched:
+            stats = self.groupStats[root]
+            changes.append((root, stats))
+            self.groupStats[root] = stats[:5] + (stats[5] & ~bit,) + stats[6:]
+        changes.append((node, self.groupStats[node]))
+        self.groupStats[node] = (1, pi, pi, pj, pj, liberties, len(self.moveHistory), move)
+        self.groupRoots[value].add(node)
 
-    def gameOver(self, currentState):
-        return (len(self.getAvailableMoves(currentState)) == 0)
+        links = []
+        for (ni, nj, neighbor) in self.cellNeighbors[node]:
+            if(self.hexBoard[ni][nj] == value):
+                self.union(node, neighbor, value, links)
+
+        self.ufHistory.append((node, value, links, changes, self.winner))
+        self.moveHistory.append(move)
+        self.emptyCount -= 1
+        if(self.winner == VALUE_EMPTY and self.spansBoard(self.groupStats[self.find(node)], value)):
+            self.winner = value
+
+    def spansBoard(self, stats, value):
+        if(value == VALUE_RED):
+            return (stats[3] == 0 and stats[4] == self.boardSize-1)
+        return (stats[1] == 0 and stats[2] == self.boardSize-1)
+
+    def disconnectStone(self):
+        node, value, links, changes, self.winner = self.ufHistory.pop()
+        roots = self.groupRoots[value]
+        for (child, root, stats) in reversed(links):
+            self.ufParent[child] = child
+            self.ufSize[root] -= self.ufSize[child]
+            self.groupStats[root] = stats
+            roots.add(child)
+        for (root, stats) in reversed(changes):
+            self.groupStats[root] = stats
+        roots.discard(node)
+        self.moveHistory.pop()
+        self.emptyCount += 1
+
+def initRootWorker(sharedBound, boardSize, color, settings):
+    # each worker keeps its own agent, board copy and caches for the whole game
+    ROOT_WORKER["bound"] = sharedBound
+    ROOT_WORKER["agent"] = HexAgent(boardSize, color, *settings[:4], bitboard=settings[4])
+
+def searchRootMoves(task):
+    history, moves, depth, deadline = task
+    agent = ROOT_WORKER["agent"]
+    agent.syncHistory(history)
+    agent.transpositionTable.newSearch()
+    agent.newSearch()
+    agent.deadline = deadline
+    try:
+        bestMove, bestScore = agent.searchRoot(moves, depth, ROOT_WORKER["bound"])
+        return bestMove, bestScore, agent.counters()
+    except SearchTimeout:
+        agent.unwindSearch(len(history))
+        return None
+    finally:
+        agent.deadline = None
+
+def startPondering(searcher):
+    # searcher.ponder runs until the returned event is set
+    stop = threading.Event()
+    thread = threading.Thread(target=searcher.ponder, args=(stop,))
+    thread.daemon = True
+    thread.start()
+    return stop, thread
+
+def stopPondering(pondering):
+    if(pondering is not None):
+        stop, thread = pondering
+        stop.set()
+        thread.join()
+
+def printMoveStats(searcher, hexAgent, inp, elapsed):
+    # one json line per move on stderr, stdout belongs to the referee
+    stats = searcher.searchStats(elapsed)
+    stats["ply"] = len(hexAgent.moveHistory) + 1
+    stats["move"] = inp
+    print(json.dumps(stats, sort_keys=True), file=sys.stderr)
+    sys.stderr.flush()
 
 def main(argv):
     try:
-        opts, args = getopt.getopt(argv, "dp:s:", ["debug","player=","size="])
+        opts, args = getopt.getopt(argv, "dp:s:t:w:", ["debug","player=","size=","time=","workers=","ttsize=","radius=","eval=","engine=","ponder","book=","stats","solve=","search=","clock=","bitboard"])
     except getopt.GetoptError:
-        print('Error: RandomHex.py [-d] [-p <ai_color>] [-s <board_size>]')
-        print('.  or: RandomHex.py [--debug] [--player=<ai_color>] [--size=<board_size>]')
+        print('Error: HexPlayer.py [-d] [-p <ai_color>] [-s <board_size>] [-t <seconds_per_move>] [-w <workers>]')
+        print('.  or: HexPlayer.py [--debug] [--player=<ai_color>] [--size=<board_size>] [--time=<seconds_per_move>] [--workers=<workers>] [--ttsize=<entries>] [--radius=<cells>] [--eval=<evaluator>] [--engine=<minimax|mcts>] [--ponder] [--book=<file|default>] [--stats] [--solve=<empties>] [--search=<alphabeta|pvs>] [--clock=<seconds_per_game>] [--bitboard]')
         sys.exit(2)
 
     # default arguments
     arg_player = "RED"
     arg_size = 7
     arg_debug = False
+    arg_ttsize = TT_DEFAULT_SIZE
+    arg_time = None
+    arg_radius = FRONTIER_RADIUS
+    arg_eval = DEFAULT_EVALUATOR
+    arg_engine = "minimax"
+    arg_workers = 1
+    arg_ponder = False
+    arg_book = None
+    arg_stats = False
+    arg_solve = None
+    arg_search = "alphabeta"
+    arg_clock = None
+    arg_bitboard = False
     for opt, arg in opts:
         if opt in ("-d","--debug"):
             arg_debug = True
+        elif opt == "--bitboard":
+            arg_bitboard = True
+        elif opt == "--ponder":
+            arg_ponder = True
+        elif opt == "--stats":
+            arg_stats = True
+        elif opt == "--solve":
+            try:
+                arg_solve = int(arg)
+                if arg_solve<0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid solver threshold, should be a non-negative integer.')
+                sys.exit(2)
+        elif opt == "--book":
+            arg_book = arg
+        elif opt == "--clock":
+            try:
+                arg_clock = float(arg)
+                if arg_clock<=0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid clock, should be a positive number of seconds.')
+                sys.exit(2)
+        elif opt == "--search":
+            arg_search = arg.lower()
+            if not arg_search in SEARCHES:
+                print('Error: Invalid search, should be either "alphabeta" or "pvs".')
+                sys.exit(2)
         elif opt in ("-p","--player"):
             arg_player = arg.upper()
             if not arg_player in ["RED","BLUE"]:
@@ -418,6 +1582,52 @@ def main(argv):
             except Exception:
                 print('Error: Invalid size, should be integer in [1,26].')
                 sys.exit(2)
+        elif opt in ("-t","--time"):
+            try:
+                arg_time = float(arg)
+                if arg_time<=0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid time, should be a positive number of seconds.')
+                sys.exit(2)
+        elif opt == "--radius":
+            try:
+                arg_radius = int(arg)
+                if arg_radius<=0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid radius, should be a positive integer.')
+                sys.exit(2)
+        elif opt == "--eval":
+            arg_eval = arg.lower()
+            if not (arg_eval == "legacy" or arg_eval in EVALUATORS):
+                print('Error: Invalid evaluator, should be one of "legacy", "twodistance", "resistance" or "montecarlo".')
+                sys.exit(2)
+        elif opt == "--engine":
+            arg_engine = arg.lower()
+            if not arg_engine in ["minimax","mcts"]:
+                print('Error: Invalid engine, should be either "minimax" or "mcts".')
+                sys.exit(2)
+        elif opt in ("-w","--workers"):
+            try:
+                arg_workers = int(arg)
+                if arg_workers<=0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid number of workers, should be a positive integer.')
+                sys.exit(2)
+        elif opt == "--ttsize":
+            try:
+                arg_ttsize = int(arg)
+                if arg_ttsize<=0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid transposition table size, should be a positive integer.')
+                sys.exit(2)
+
+    if arg_search == "pvs" and arg_workers > 1:
+        print('Error: --search=pvs runs in one process and cannot be combined with --workers.')
+        sys.exit(2)
 
     # initialize the game
     color = 0
@@ -425,19 +1635,54 @@ def main(argv):
         color = VALUE_RED
     else:
         color = VALUE_BLUE
-    hexAgent = HexAgent(arg_size, color)
+    if arg_book is not None and arg_book.lower() == "default":
+        # the shipped book for this size
+        arg_book = defaultBookPath(arg_size)
+    try:
+        hexAgent = HexAgent(arg_size, color, arg_ttsize, arg_time, arg_radius, arg_eval, arg_workers, arg_book, arg_solve, arg_search, arg_bitboard)
+    except (ImportError, IOError, ValueError) as error:
+        print('Error: {}.'.format(error))
+        sys.exit(2)
+    clock = None
+    if arg_clock is not None:
+        # the game clock replaces any fixed time per move
+        clock = TimeManager(arg_clock)
+        hexAgent.clock = clock
+    engine = None
+    if(arg_engine == "mcts"):
+        engine = MCTSEngine(hexAgent)
+    searcher = hexAgent
+    if engine is not None:
+        searcher = engine
 
     while(True):
         if hexAgent.color==VALUE_RED:
             # RED playes first
-            c_pos = hexAgent.minimax()
+            start = time.time()
+            if clock is not None:
+                clock.startMove(hexAgent)
+            if engine is None:
+                c_pos = hexAgent.minimax()
+            else:
+                c_pos = engine.search()
+            elapsed = time.time() - start
             c_inp = hexAgent.pos_to_inp(c_pos)
             # introduce random time pause
             # time.sleep(random.randint(0,4))
             print(c_inp)
+            if clock is not None:
+                clock.stopMove()
+            if arg_stats:
+                printMoveStats(searcher, hexAgent, c_inp, elapsed)
+            if arg_debug:
+                hexAgent.print_search_stats()
         else:
-            # wait for opponent
+            # wait for opponent, searching its replies in the meantime
+            pondering = None
+            if arg_ponder:
+                pondering = startPondering(searcher)
             c_inp = input()
+            stopPondering(pondering)
             c_pos = hexAgent.inp_to_pos(c_inp)
         # RED MOVES
         hexAgent.update_board(hexAgent.hexBoard, c_pos, VALUE_RED)
@@ -446,14 +1691,31 @@ def main(argv):
 
         if hexAgent.color==VALUE_BLUE:
             # BLUE playes
-            c_pos = hexAgent.minimax()
+            start = time.time()
+            if clock is not None:
+                clock.startMove(hexAgent)
+            if engine is None:
+                c_pos = hexAgent.minimax()
+            else:
+                c_pos = engine.search()
+            elapsed = time.time() - start
             c_inp = hexAgent.pos_to_inp(c_pos)
             # introduce random time pause
             # time.sleep(random.randint(0,4))
             print(c_inp)
+            if clock is not None:
+                clock.stopMove()
+            if arg_stats:
+                printMoveStats(searcher, hexAgent, c_inp, elapsed)
+            if arg_debug:
+                hexAgent.print_search_stats()
         else:
-            # wait for opponent
+            # wait for opponent, searching its replies in the meantime
+            pondering = None
+            if arg_ponder:
+                pondering = startPondering(searcher)
             c_inp = input()
+            stopPondering(pondering)
             c_pos = hexAgent.inp_to_pos(c_inp)
         # BLUE MOVES
         hexAgent.update_board(hexAgent.hexBoard, c_pos, VALUE_BLUE)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexServer.py
+@version: 0.1
+@description:
+Long lived engine server, one process plays many games at once. Every connection is one game:
+the first line holds HexPlayer options ("-p BLUE -s 11 -t 1 --eval=resistance"), after that the
+connection talks like HexPlayer's stdin and stdout. The server writes its moves, reads the
+opponent's, and closes the connection once the game is over. An error is sent as a "# Error:"
+line before closing. Searches run in worker processes. Each game stays pinned to one worker, which
+keeps its HexAgent, tables and caches until the game ends.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import getopt
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from HexPlayer import HexAgent, TimeManager, parseMove, VALUE_EMPTY, VALUE_RED, VALUE_BLUE, TT_DEFAULT_SIZE, FRONTIER_RADIUS, DEFAULT_EVALUATOR, SEARCHES
+from HexMCTS import MCTSEngine
+from HexEvaluator import EVALUATORS
+from HexOpeningBook import defaultBookPath
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8165
+SERVER_SESSIONS = {}  # session id -> (agent, searcher, clock), per worker process
+
+def parseSession(argv):
+    # HexPlayer options of a session header, ValueError explains what is wrong
+    try:
+        opts, args = getopt.getopt(argv, "p:s:t:", ["player=","size=","time=","ttsize=","radius=","eval=","engine=","book=","solve=","search=","clock=","bitboard"])
+    except getopt.GetoptError as error:
+        raise ValueError(str(error))
+    color = VALUE_RED
+    size = 7
+    moveTime = None
+    ttSize = TT_DEFAULT_SIZE
+    radius = FRONTIER_RADIUS
+    evaluator = DEFAULT_EVALUATOR
+    engine = "minimax"
+    book = None
+    solve = None
+    search = "alphabeta"
+    clock = None
+    bitboard = False
+    for opt, arg in opts:
+        try:
+            if opt == "--bitboard":
+                bitboard = True
+            elif opt in ("-p","--player"):
+                color = {"RED": VALUE_RED, "BLUE": VALUE_BLUE}[arg.upper()]
+            elif opt in ("-s","--size"):
+                size = int(arg)
+                if size<=0 or size>26:
+                    raise Exception()
+            elif opt in ("-t","--time"):
+                moveTime = float(arg)
+                if moveTime<=0:
+                    raise Exception()
+            elif opt == "--ttsize":
+                ttSize = int(arg)
+                if ttSize<=0:
+                    raise Exception()
+            elif opt == "--radius":
+                radius = int(arg)
+                if radius<=0:
+                    raise Exception()
+            elif opt == "--eval":
+                evaluator = arg.lower()
+                if not (evaluator == "legacy" or evaluator in EVALUATORS):
+                    raise Exception()
+            elif opt == "--engine":
+                engine = arg.lower()
+                if not engine in ["minimax","mcts"]:
+                    raise Exception()
+            elif opt == "--book":
+                book = arg
+            elif opt == "--solve":
+                solve = int(arg)
+                if solve<0:
+                    raise Exception()
+            elif opt == "--search":
+                search = arg.lower()
+                if not search in SEARCHES:
+                    raise Exception()
+            elif opt == "--clock":
+                clock = float(arg)
+                if clock<=0:
+                    raise Exception()
+        except Exception:
+            raise ValueError('Invalid {} value "{}"'.format(opt, arg))
+    if book is not None and book.lower() == "default":
+        book = defaultBookPath(size)
+    return (color, size, moveTime, ttSize, radius, evaluator, engine, book, solve, search, clock, bitboard)
+
+def gameOver(agent):
+    return agent.winner != VALUE_EMPTY or agent.emptyCount == 0
+
+def openSession(sessionId, settings):
+    # runs in the worker that owns the session from here on
+    color, size, moveTime, ttSize, radius, evaluator, engine, book, solve, search, clock, bitboard = settings
+    agent = HexAgent(size, color, ttSize, moveTime, radius, evaluator, 1, book, solve, search, bitboard)
+    if clock is not None:
+        # the session's game clock, only the worker's own searches count against it
+        clock = TimeManager(clock)
+        agent.clock = clock
+    searcher = agent
+    if(engine == "mcts"):
+        searcher = MCTSEngine(agent)
+    SERVER_SESSIONS[sessionId] = (agent, searcher, clock)
+
+def searchMove(sessionId):
+    # the agent's move as text, its search statistics and whether it ended the game
+    agent, searcher, clock = SERVER_SESSIONS[sessionId]
+    start = time.time()
+    if clock is not None:
+        clock.startMove(agent)
+    if searcher is agent:
+        move = agent.minimax()
+    else:
+        move = searcher.search()
+    if clock is not None:
+        clock.stopMove()
+    elapsed = time.time() - start
+    inp = agent.pos_to_inp(move)
+    stats = searcher.searchStats(elapsed)
+    stats["ply"] = len(agent.moveHistory) + 1
+    stats["move"] = inp
+    agent.update_board(agent.hexBoard, move, agent.color)
+    return inp, stats, gameOver(agent)
+
+def playMove(sessionId, inp):
+    # None when the opponent's move is malformed or taken, else whether it ended the game
+    agent, searcher, clock = SERVER_SESSIONS[sessionId]
+    move = parseMove(inp, agent.boardSize)
+    if(move is None or agent.hexBoard[move[0]][move[1]] != VALUE_EMPTY):
+        return None
+    agent.update_board(agent.hexBoard, move, -agent.color)
+    return gameOver(agent)
+
+def startWorker():
+    # submitted once per worker so every process is up before the first game
+    return os.getpid()
+
+def closeSession(sessionId):
+    if sessionId in SERVER_SESSIONS:
+        agent, searcher, clock = SERVER_SESSIONS.pop(sessionId)
+        agent.close()
+
+class HexServer:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, jobs, logStats=False):
+        # one single process executor per worker, so a session always finds its agent; spawned
+        # workers do not inherit the sockets of connections open at the time
+        context = multiprocessing.get_context("spawn")
+        self.workers = [ProcessPoolExecutor(max_workers=1, mp_context=context) for x in range(jobs)]
+        self.sessions = [0 for x in range(jobs)]
+        self.nextSession = 0
+        self.logStats = logStats
+        self.games = 0
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    async def serve(self, host, port, path=None):
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*[loop.run_in_executor(worker, startWorker) for worker in self.workers])
+        if path is not None:
+            server = await asyncio.start_unix_server(self.playGame, path=path)
+            print("# serving on {} with {} workers".format(path, len(self.workers)), file=sys.stderr)
+        else:
+            server = await asyncio.start_server(self.playGame, host, port)
+            print("# serving on {}:{} with {} workers".format(host, port, len(self.workers)), file=sys.stderr)
+        sys.stderr.flush()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        for worker in self.workers:
+            worker.shutdown()
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    async def playGame(self, reader, writer):
+        loop = asyncio.get_event_loop()
+        header = await reader.readline()
+        try:
+            settings = parseSession(header.decode().split())
+        except ValueError as error:
+            await self.send(writer, "# Error: {}.".format(error))
+            writer.close()
+            return
+
+        # the least busy worker owns the session for the whole game
+        index = self.sessions.index(min(self.sessions))
+        worker = self.workers[index]
+        self.sessions[index] += 1
+        sessionId = self.nextSession
+        self.nextSession += 1
+        color = settings[0]
+        try:
+            await loop.run_in_executor(worker, openSession, sessionId, settings)
+            value = VALUE_RED
+            over = False
+            while(not over):
+                if(value == color):
+                    inp, stats, over = await loop.run_in_executor(worker, searchMove, sessionId)
+                    await self.send(writer, inp)
+                    if self.logStats:
+                        stats["session"] = sessionId
+                        print(json.dumps(stats, sort_keys=True), file=sys.stderr)
+                        sys.stderr.flush()
+                else:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    over = await loop.run_in_executor(worker, playMove, sessionId, line.decode().strip())
+                    if over is None:
+                        await self.send(writer, "# Error: invalid position.")
+                        break
+                value = -value
+            self.games += 1
+        except (ImportError, IOError, ValueError) as error:
+            await self.send(writer, "# Error: {}.".format(error))
+        finally:
+            await loop.run_in_executor(worker, closeSession, sessionId)
+            self.sessions[index] -= 1
+            writer.close()
+
+    async def send(self, writer, line):
+        try:
+            writer.write((line + "\n").encode())
+            await writer.drain()
+        except (ConnectionError, IOError):
+            pass
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "h:p:j:", ["host=","port=","jobs=","unix=","stats"])
+    except getopt.GetoptError:
+        print('Error: HexServer.py [-h <host>] [-p <port>] [-j <jobs>]')
+        print('.  or: HexServer.py [--host=<host>] [--port=<port>] [--jobs=<jobs>] [--unix=<socket_path>] [--stats]')
+        sys.exit(2)
+
+    arg_host = SERVER_HOST
+    arg_port = SERVER_PORT
+    arg_jobs = os.cpu_count() or 1
+    arg_unix = None
+    arg_stats = False
+    for opt, arg in opts:
+        try:
+            if opt in ("-h","--host"):
+                arg_host = arg
+            elif opt in ("-p","--port"):
+                arg_port = int(arg)
+                if arg_port<0 or arg_port>65535:
+                    raise Exception()
+            elif opt in ("-j","--jobs"):
+                arg_jobs = int(arg)
+                if arg_jobs<=0:
+                    raise Exception()
+            elif opt == "--unix":
+                arg_unix = arg
+            elif opt == "--stats":
+                arg_stats = True
+        except Exception:
+            print('Error: Invalid {} value "{}".'.format(opt, arg))
+            sys.exit(2)
+
+    server = HexServer(arg_jobs, arg_stats)
+    try:
+        asyncio.run(server.serve(arg_host, arg_port, arg_unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print("# {} games played".format(server.games), file=sys.stderr)
+
+if __name__=="__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexSolver.py
+@version: 0.1
+@description:
+Exact endgame solver for HexAgent. H-search builds virtual connections (the owner stays connected
+even when the opponent moves first) and semi-connections (connected once the owner plays the key)
+from adjacencies with the AND and OR rules. A depth-first proof search then only tries moves
+inside the opponent's edge-to-edge semi-connections, and stops as soon as either side holds an
+edge-to-edge connection. The search gives up once its time, node or table budget is spent.
+'''
+
+from __future__ import print_function
+
+import time
+
+from HexGeometry import boardGeometry, VALUE_EMPTY, VALUE_RED, VALUE_BLUE
+
+VC_LIMIT = 8  # virtual connections kept per pair of nodes
+SC_LIMIT = 12  # semi-connections kept per pair of nodes
+SOLVER_TABLE_LIMIT = 1 << 18  # proven positions kept between moves
+SOLVER_NODE_LIMIT = 200000
+
+class SolverAbort(Exception):
+    # raised once the solver's time or node budget is spent
+    pass
+
+class Connections:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, connected, edgeVCs, edgeSCs, hotness):
+        # edgeVCs are carriers, edgeSCs are (carrier, key) pairs, carriers are bit masks of
+        # empty cells; hotness counts how many semi-connection carriers hold each cell
+        self.connected = connected
+        self.edgeVCs = edgeVCs
+        self.edgeSCs = edgeSCs
+        self.hotness = hotness
+
+class HSearch:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, geometry):
+        self.geometry = geometry
+        cells = geometry.cells
+        self.edgeNodes = {}
+        self.edgeCells = {}
+        for value in (VALUE_RED, VALUE_BLUE):
+            self.edgeNodes[value] = (cells, cells+1)
+            self.edgeCells[value] = (set(geometry.edges[value][0]), set(geometry.edges[value][1]))
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def run(self, board, color, deadline=None):
+        geometry = self.geometry
+        cells = geometry.cells
+        edgeA, edgeB = self.edgeNodes[color]
+        cellsA, cellsB = self.edgeCells[color]
+
+        # own groups are single nodes, groups touching an edge become that edge's node
+        parent = list(range(cells+2))
+        def find(node):
+            while(parent[node] != node):
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+        def union(a, b):
+            a = find(a)
+            b = find(b)
+            if(a != b):
+                # edge nodes stay roots so their ids are stable
+                if(a >= cells):
+                    parent[b] = a
+                else:
+                    parent[a] = b
+        for cell in range(cells):
+            if(board[cell] != color):
+                continue
+            for neighbor in geometry.neighbors[cell]:
+                if(board[neighbor] == color):
+                    union(cell, neighbor)
+            if(cell in cellsA):
+                union(cell, edgeA)
+            if(cell in cellsB):
+                union(cell, edgeB)
+        if(find(edgeA) == find(edgeB)):
+            return Connections(True, [0], [], {})
+
+        self.vcs = {}
+        self.scs = {}
+        self.partners = {}
+        self.work = []
+        self.isStone = lambda node: node >= cells or board[node] == color
+        for cell in range(cells):
+            if(board[cell] != VALUE_EMPTY):
+                continue
+            for neighbor in geometry.neighbors[cell]:
+                if(board[neighbor] == VALUE_EMPTY):
+                    if(cell < neighbor):
+                        self.addVC(cell, neighbor, 0)
+                elif(board[neighbor] == color):
+                    self.addVC(cell, find(neighbor), 0)
+            if(cell in cellsA):
+                self.addVC(cell, edgeA, 0)
+            if(cell in cellsB):
+                self.addVC(cell, edgeB, 0)
+
+        steps = 0
+        while(self.work):
+            steps += 1
+            if(deadline is not None and (steps & 63) == 0 and time.time() > deadline):
+                raise SolverAbort()
+            a, b, carrier = self.work.pop()
+            if(carrier not in self.vcs.get((a, b), ())):
+                continue
+            self.andRule(a, b, carrier)
+            self.andRule(b, a, carrier)
+
+        pair = self.pairKey(edgeA, edgeB)
+        hotness = {}
+        for key in self.scs:
+            for (carrier, semiKey) in self.scs[key]:
+                while(carrier):
+                    low = carrier & -carrier
+                    cell = low.bit_length() - 1
+                    hotness[cell] = hotness.get(cell, 0) + 1
+                    carrier ^= low
+        return Connections(False, list(self.vcs.get(pair, ())), list(self.scs.get(pair, ())), hotness)
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def pairKey(self, a, b):
+        if(a < b):
+            return (a, b)
+        return (b, a)
+
+    def andRule(self, end, middle, carrier):
+        # combine end-middle with every middle-other connection that shares no cell with it
+        endBit = 0
+        if(not self.isStone(end)):
+            endBit = 1 << end
+        middleStone = self.isStone(middle)
+        for other in list(self.partners.get(middle, ())):
+            if(other == end):
+                continue
+            otherBit = 0
+            if(not self.isStone(other)):
+                otherBit = 1 << other
+            if(carrier & otherBit):
+                continue
+            for second in list(self.vcs.get(self.pairKey(middle, other), ())):
+                if(second & carrier or second & endBit):
+                    continue
+                if(middleStone):
+                    self.addVC(end, other, carrier | second)
+                else:
+                    self.addSC(end, other, carrier | second | (1 << middle), middle)
+
+    def addVC(self, a, b, carrier):
+        key = self.pairKey(a, b)
+        known = self.vcs.setdefault(key, [])
+        for existing in known:
+            if(existing & carrier == existing):
+                return
+        known[:] = [existing for existing in known if existing & carrier != carrier]
+        if(len(known) >= VC_LIMIT):
+            return
+        known.append(carrier)
+        self.partners.setdefault(a, set()).add(b)
+        self.partners.setdefault(b, set()).add(a)
+        self.work.append((key[0], key[1], carrier))
+
+    def addSC(self, a, b, carrier, semiKey):
+        key = self.pairKey(a, b)
+        for existing in self.vcs.get(key, ()):
+            if(existing & carrier == existing):
+                return
+        known = self.scs.setdefault(key, [])
+        for (existing, existingKey) in known:
+            if(existing & carrier == existing):
+                return
+        if(len(known) >= SC_LIMIT):
+            return
+        # or rule: semi-connections whose carriers share no cell make a virtual connection
+        intersection = carrier
+        union = carrier
+        for (existing, existingKey) in known:
+            if(intersection & existing != intersection):
+                intersection &= existing
+                union |= existing
+                if(intersection == 0):
+                    self.addVC(a, b, union)
+                    return
+        known.append((carrier, semiKey))
+
+class HexSolver:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, boardSize, zobrist, tableLimit=SOLVER_TABLE_LIMIT, nodeLimit=SOLVER_NODE_LIMIT):
+        self.boardSize = boardSize
+        self.geometry = boardGeometry(boardSize)
+        self.hsearch = HSearch(self.geometry)
+        self.zobrist = zobrist
+        self.tableLimit = tableLimit
+        self.nodeLimit = nodeLimit
+        # zobrist key -> (side to move wins, move), shared between moves
+        self.table = {}
+        self.nodes = 0
+        self.deadline = None
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def solve(self, hexBoard, toMove, timeLimit):
+        # (True, move) when toMove wins with move, (False, None) when it loses against any
+        # defence, (None, None) when the budget ran out first
+        board = [value for row in hexBoard for value in row]
+        key = 0
+        for cell in range(len(board)):
+            if(board[cell] != VALUE_EMPTY):
+                key ^= self.stoneKey(cell, board[cell])
+        self.nodes = 0
+        self.deadline = time.time() + timeLimit
+        try:
+            win, cell = self.prove(board, key, toMove)
+        except SolverAbort:
+            return None, None
+        finally:
+            self.deadline = None
+        if(cell is None):
+            return win, None
+        return win, (cell // self.boardSize, cell % self.boardSize)
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def stoneKey(self, cell, value):
+        if(value == VALUE_RED):
+            return self.zobrist[cell][0]
+        return self.zobrist[cell][1]
+
+    def prove(self, board, key, toMove):
+        self.nodes += 1
+        if(self.nodes > self.nodeLimit or time.time() > self.deadline):
+            raise SolverAbort()
+        if key in self.table:
+            return self.table[key]
+
+        theirs = self.hsearch.run(board, -toMove, self.deadline)
+        if(theirs.connected or theirs.edgeVCs):
+            return self.store(key, False, None)
+        mine = self.hsearch.run(board, toMove, self.deadline)
+        if(mine.connected):
+            # already won, there is no move left to prove
+            return self.store(key, True, None)
+        if(mine.edgeSCs):
+            return self.store(key, True, mine.edgeSCs[0][1])
+        if(mine.edgeVCs):
+            # an extra own stone never hurts, any cell keeps a virtual connection
+            carrier = min(mine.edgeVCs, key=lambda carrier: bin(carrier).count("1"))
+            return self.store(key, True, (carrier & -carrier).bit_length() - 1)
+
+        # outside every opponent semi-connection the opponent completes it and wins
+        mustPlay = 0
+        for cell in range(len(board)):
+            if(board[cell] == VALUE_EMPTY):
+                mustPlay |= 1 << cell
+        for (carrier, semiKey) in theirs.edgeSCs:
+            mustPlay &= carrier
+        candidates = []
+        while(mustPlay):
+            low = mustPlay & -mustPlay
+            candidates.append(low.bit_length() - 1)
+            mustPlay ^= low
+        candidates.sort(key=lambda cell: -(theirs.hotness.get(cell, 0) + mine.hotness.get(cell, 0)))
+
+        for cell in candidates:
+            board[cell] = toMove
+            childKey = key ^ self.stoneKey(cell, toMove)
+            try:
+                childWins, childMove = self.prove(board, childKey, -toMove)
+            finally:
+                board[cell] = VALUE_EMPTY
+            if(not childWins):
+                return self.store(key, True, cell)
+        return self.store(key, False, None)
+
+    def store(self, key, win, cell):
+        if(len(self.table) < self.tableLimit):
+            self.table[key] = (win, cell)
+        return (win, cell)
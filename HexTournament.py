@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+@author: Erick Suarez
+@contact: esuarez@cs.ucsb.edu
+@file: HexTournament.py
+@version: 0.1
+@description:
+Tournament harness. Players are started with "-p <RED|BLUE> -s <size>" and talk over stdin and
+stdout like they do with HexReferee. Every player must start and make a first move before the
+schedule runs. Games run in parallel, every pairing plays both colors, and JSON lines a player
+writes to stderr are collected for its node counts. Prints win rates with Wilson confidence
+intervals and per-move latency. Games a player could not even start in are listed as failed and
+left out of the rates.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import math
+import time
+import queue
+import getopt
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from HexGeometry import boardGeometry
+from HexPlayer import parseMove, VALUE_EMPTY, VALUE_RED, VALUE_BLUE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLAYERS = {
+    "hexplayer": [sys.executable, os.path.join(HERE, "HexPlayer.py"), "--stats"],
+    "random": [sys.executable, os.path.join(HERE, "RandomHex.py")],
+    "baseline2": [os.path.join(HERE, "baseline2")],
+    "baseline3": [os.path.join(HERE, "baseline3")],
+}
+WILSON_Z = 1.96  # 95% interval
+
+def wilsonInterval(wins, games, z=WILSON_Z):
+    if(games == 0):
+        return (0.0, 1.0)
+    rate = wins / games
+    denominator = 1 + z*z/games
+    center = (rate + z*z/(2*games)) / denominator
+    spread = z*math.sqrt(rate*(1-rate)/games + z*z/(4*games*games)) / denominator
+    return (max(0.0, center - spread), min(1.0, center + spread))
+
+class PlayerProcess:
+    # ======================================================================================
+    # Constructor
+    # ======================================================================================
+    def __init__(self, command, color, boardSize):
+        if(color == VALUE_RED):
+            side = "RED"
+        else:
+            side = "BLUE"
+        self.process = subprocess.Popen(command + ["-p", side, "-s", str(boardSize)], cwd=HERE,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        universal_newlines=True, bufsize=1)
+        self.stats = []
+        self.lastError = ""
+        self.reader = threading.Thread(target=self.readStats)
+        self.reader.daemon = True
+        self.reader.start()
+        # a thread moves stdout lines into a queue, so a timed wait also sees lines the pipe's
+        # buffer has already read
+        self.lines = queue.Queue()
+        self.lineReader = threading.Thread(target=self.readLines)
+        self.lineReader.daemon = True
+        self.lineReader.start()
+
+    # ======================================================================================
+    # Public Methods
+    # ======================================================================================
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def receive(self, timeout):
+        # next stdout line, None on timeout or when the player exits
+        try:
+            line = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if(line is None):
+            # keep the end marker for any later call
+            self.lines.put(None)
+        return line
+
+    def close(self):
+        if(self.process.poll() is None):
+            self.process.kill()
+        self.process.wait()
+        self.reader.join(1.0)
+        self.lineReader.join(1.0)
+
+    # ======================================================================================
+    # Private Methods
+    # ======================================================================================
+    def readLines(self):
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+        self.lines.put(None)
+
+    def readStats(self):
+        # json objects on stderr are per move statistics, the last other line explains crashes
+        for line in self.process.stderr:
+            line = line.strip()
+            if(not line.startswith("{")):
+                if(line):
+                    self.lastError = line
+                continue
+            try:
+                self.stats.append(json.loads(line))
+            except ValueError:
+                pass
+
+def connected(board, value, geometry):
+    start = [cell for cell in geometry.edges[value][0] if board[cell] == value]
+    goal = set(geometry.edges[value][1])
+    seen = set(start)
+    stack = list(start)
+    while(stack):
+        cell = stack.pop()
+        if(cell in goal):
+            return True
+        for neighbor in geometry.neighbors[cell]:
+            if(board[neighbor] == value and neighbor not in seen):
+                seen.add(neighbor)
+                stack.append(neighbor)
+    return False
+
+def checkPlayer(command, boardSize, moveLimit):
+    # None when the player starts and makes a first move as red, else the reason it cannot
+    try:
+        player = PlayerProcess(command, VALUE_RED, boardSize)
+    except (OSError, IOError) as error:
+        return str(error)
+    try:
+        if(player.receive(moveLimit) is None):
+            try:
+                player.process.wait(0.5)
+                player.reader.join(0.5)
+            except subprocess.TimeoutExpired:
+                return "no first move within {}s".format(moveLimit)
+            return player.lastError or "exited with status {}".format(player.process.returncode)
+        return None
+    finally:
+        player.close()
+
+def playGame(task):
+    redName, blueName, commands, boardSize, moveLimit = task
+    geometry = boardGeometry(boardSize)
+    board = [VALUE_EMPTY] * geometry.cells
+    names = {VALUE_RED: redName, VALUE_BLUE: blueName}
+    latency = {VALUE_RED: [], VALUE_BLUE: []}
+    players = {}
+    winner = VALUE_EMPTY
+    reason = "connection"
+    moves = []
+    value = VALUE_RED
+    try:
+        for value in (VALUE_RED, VALUE_BLUE):
+            players[value] = PlayerProcess(commands[names[value]], value, boardSize)
+    except (OSError, IOError) as error:
+        # nobody played, the game has no winner
+        winner = None
+        reason = "startup: {} {}".format(names[value], error)
+    try:
+        value = VALUE_RED
+        while(winner == VALUE_EMPTY):
+            start = time.time()
+            line = players[value].receive(moveLimit)
+            latency[value].append(time.time() - start)
+            if(line is None):
+                winner = -value
+                try:
+                    players[value].process.wait(0.5)
+                    players[value].reader.join(0.5)
+                    reason = "crash: {}".format(players[value].lastError)
+                except subprocess.TimeoutExpired:
+                    reason = "timeout"
+                break
+            move = parseMove(line, boardSize)
+            if(move is None or board[move[0]*boardSize + move[1]] != VALUE_EMPTY):
+                winner = -value
+                reason = "illegal move {}".format(line)
+                break
+            board[move[0]*boardSize + move[1]] = value
+            moves.append(line)
+            if(connected(board, value, geometry)):
+                winner = value
+                break
+            value = -value
+            players[value].send(line)
+    except (OSError, IOError) as error:
+        # a player whose pipe broke loses
+        winner = -value
+        if value in players:
+            players[value].reader.join(0.5)
+            error = players[value].lastError or error
+        reason = "crash: {}".format(error)
+    finally:
+        for player in players.values():
+            player.close()
+
+    nodes = {}
+    for color in (VALUE_RED, VALUE_BLUE):
+        stats = players[color].stats if color in players else []
+        nodes[color] = [entry["nodes"] for entry in stats if "nodes" in entry]
+    return {
+        "red": redName, "blue": blueName, "size": boardSize,
+        "winner": names.get(winner), "reason": reason, "moves": moves,
+        "latency": {"red": latency[VALUE_RED], "blue": latency[VALUE_BLUE]},
+        "nodes": {"red": nodes[VALUE_RED], "blue": nodes[VALUE_BLUE]},
+    }
+
+def schedule(names, games, gauntlet):
+    # every pairing plays games games, alternating which side is red
+    if gauntlet:
+        pairs = [(names[0], other) for other in names[1:]]
+    else:
+        pairs = [(names[a], names[b]) for a in range(len(names)) for b in range(a+1, len(names))]
+    tasks = []
+    for (first, second) in pairs:
+        for game in range(games):
+            if(game % 2 == 0):
+                tasks.append((first, second))
+            else:
+                tasks.append((second, first))
+    return tasks
+
+def report(results, names):
+    print("# {:<12} {:<12} {:>6} {:>6} {:>7}   {:<16} {:>6}".format("player", "opponent", "games", "wins", "rate", "95% interval", "failed"))
+    pairs = []
+    for result in results:
+        pair = tuple(sorted((result["red"], result["blue"]), key=names.index))
+        if pair not in pairs:
+            pairs.append(pair)
+    for (first, second) in pairs:
+        pairing = [result for result in results if set((result["red"], result["blue"])) == set((first, second))]
+        games = [result for result in pairing if result["winner"] is not None]
+        failed = len(pairing) - len(games)
+        wins = sum(1 for result in games if result["winner"] == first)
+        low, high = wilsonInterval(wins, len(games))
+        rate = wins / len(games) if len(games) > 0 else 0.0
+        print("# {:<12} {:<12} {:>6} {:>6} {:>7.3f}   [{:.3f}, {:.3f}]   {:>6}".format(
+            first, second, len(games), wins, rate, low, high, failed))
+
+    print("# {:<12} {:>8} {:>10} {:>10} {:>12}".format("player", "moves", "mean s", "max s", "mean nodes"))
+    for name in names:
+        times = []
+        nodes = []
+        for result in results:
+            for color in ("red", "blue"):
+                if(result[color] == name):
+                    times += result["latency"][color]
+                    nodes += result["nodes"][color]
+        if(len(times) == 0):
+            continue
+        meanNodes = "-"
+        if(len(nodes) > 0):
+            meanNodes = "{:.0f}".format(sum(nodes) / len(nodes))
+        print("# {:<12} {:>8} {:>10.3f} {:>10.3f} {:>12}".format(name, len(times), sum(times) / len(times), max(times), meanNodes))
+
+    failures = [result for result in results if result["reason"] != "connection"]
+    for result in failures:
+        if(result["winner"] is None):
+            print("# {} vs {}: not played, {}".format(result["red"], result["blue"], result["reason"]))
+        else:
+            print("# {} vs {}: {} won by {}".format(result["red"], result["blue"], result["winner"], result["reason"]))
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "s:g:j:l:o:", ["size=","games=","jobs=","limit=","output=","player=","gauntlet"])
+    except getopt.GetoptError:
+        print('Error: HexTournament.py [-s <board_size>] [-g <games>] [-j <jobs>] [-l <seconds_per_move>] [-o <file>] <player> <player> ...')
+        print('.  or: HexTournament.py [--size=<board_size>] [--games=<games>] [--jobs=<jobs>] [--limit=<seconds_per_move>] [--output=<file>] [--player=<name>=<command>] [--gauntlet] <player> ...')
+        sys.exit(2)
+
+    arg_size = 7
+    arg_games = 10
+    arg_jobs = os.cpu_count() or 1
+    arg_limit = 30.0
+    arg_output = None
+    arg_gauntlet = False
+    commands = dict(PLAYERS)
+    names = []
+    for opt, arg in opts:
+        try:
+            if opt in ("-s","--size"):
+                arg_size = int(arg)
+                if arg_size<=0 or arg_size>26:
+                    raise Exception()
+            elif opt in ("-g","--games"):
+                arg_games = int(arg)
+                if arg_games<=0:
+                    raise Exception()
+            elif opt in ("-j","--jobs"):
+                arg_jobs = int(arg)
+                if arg_jobs<=0:
+                    raise Exception()
+            elif opt in ("-l","--limit"):
+                arg_limit = float(arg)
+                if arg_limit<0:
+                    raise Exception()
+            elif opt in ("-o","--output"):
+                arg_output = arg
+            elif opt == "--gauntlet":
+                arg_gauntlet = True
+            elif opt == "--player":
+                # name=command, the command is split on spaces
+                name, command = arg.split("=", 1)
+                if not name or not command.split():
+                    raise Exception()
+                commands[name] = command.split()
+                names.append(name)
+        except Exception:
+            print('Error: Invalid {} value "{}".'.format(opt, arg))
+            sys.exit(2)
+    for name in args:
+        if name not in commands:
+            print('Error: Unknown player "{}", should be one of {} or given with --player.'.format(name, ", ".join(sorted(commands))))
+            sys.exit(2)
+        if name not in names:
+            names.append(name)
+    if len(names) < 2:
+        print('Error: A tournament needs at least two players.')
+        sys.exit(2)
+
+    moveLimit = arg_limit if arg_limit > 0 else None
+    for name in names:
+        error = checkPlayer(commands[name], arg_size, moveLimit)
+        if error is not None:
+            print('Error: Player "{}" cannot start: {}.'.format(name, error))
+            sys.exit(2)
+    tasks = [(red, blue, commands, arg_size, moveLimit) for (red, blue) in schedule(names, arg_games, arg_gauntlet)]
+    results = []
+    outputFile = open(arg_output, "w") if arg_output is not None else None
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=arg_jobs) as executor:
+        for result in executor.map(playGame, tasks):
+            results.append(result)
+            if outputFile is not None:
+                outputFile.write(json.dumps(result) + "\n")
+                outputFile.flush()
+    if outputFile is not None:
+        outputFile.close()
+    print("# {} games on {}x{} in {:.1f}s with {} jobs".format(len(results), arg_size, arg_size, time.time() - start, arg_jobs))
+    report(results, names)
+
+if __name__=="__main__":
+    main(sys.argv[1:])
@@ -8,6 +8,10 @@
 @description:
 This is Baseline#1 of UCSB CS165A Fall 2018 Machine Problem 2. The script implements basic random
 algorithm for playing Hex. Please read the attached readme.txt for detailed usage.
+Each game shuffles the cells once; the empty cells are kept as a prefix of that order, so a random
+move and a move played are O(1), and a union-find over the cells and the four edges tells when a
+color has connected. play_random_game is the library entry point, -g plays random games against
+each other and reports their throughput.
 '''
 
 from __future__ import print_function
@@ -17,6 +21,8 @@ import time
 import getopt
 import random
 
+from HexGeometry import boardGeometry
+
 ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 LETTER2INT = {ALPHABET[i]:i for i in range(26)}
 VALUE_EMPTY = 0
@@ -89,20 +95,113 @@ def update_board(d_board, d_pos, d_value, d_size):
         # print("# Error: invalid position.")
         sys.exit(2)
 
-def strategy_random(d_board, d_size):
-    # search for empty position
-    d_available_pos = []
-    for i in range(d_size):
-        for j in range(d_size):
-            if d_board[i][j]==VALUE_EMPTY:
-                d_available_pos.append((i,j))
-    if len(d_available_pos)==0:
+def build_geometry(d_size):
+    # cells are i*d_size+j, the edge nodes follow them: RED's two sides, then BLUE's
+    d_geometry = boardGeometry(d_size)
+    return d_geometry.neighbors, d_geometry.edgeNodes
+
+def new_game(d_size, d_random=random):
+    # one shuffled move order per game, order[:empty] holds the empty cells
+    d_cells = d_size*d_size
+    d_order = list(range(d_cells))
+    d_random.shuffle(d_order)
+    d_slot = [0]*d_cells
+    for k in range(d_cells):
+        d_slot[d_order[k]] = k
+    return {
+        "size": d_size,
+        "board": [VALUE_EMPTY]*d_cells,
+        "order": d_order,
+        "slot": d_slot,
+        "empty": d_cells,
+        "parent": list(range(d_cells+4)),
+        "winner": VALUE_EMPTY,
+    }
+
+def find(d_parent, d_node):
+    while d_parent[d_node]!=d_node:
+        d_parent[d_node] = d_parent[d_parent[d_node]]
+        d_node = d_parent[d_node]
+    return d_node
+
+def play_cell(d_game, d_cell, d_value):
+    # place a stone, O(1) on the empty set and near O(1) on the union-find
+    d_board = d_game["board"]
+    d_order = d_game["order"]
+    d_slot = d_game["slot"]
+    d_parent = d_game["parent"]
+    d_board[d_cell] = d_value
+    d_last = d_game["empty"]-1
+    d_other = d_order[d_last]
+    d_order[d_slot[d_cell]] = d_other
+    d_slot[d_other] = d_slot[d_cell]
+    d_order[d_last] = d_cell
+    d_slot[d_cell] = d_last
+    d_game["empty"] = d_last
+
+    d_neighbors, d_edges = build_geometry(d_game["size"])
+    d_root = find(d_parent, d_cell)
+    for d_node in d_neighbors[d_cell]:
+        if d_board[d_node]==d_value:
+            d_parent[find(d_parent, d_node)] = d_root
+    for d_node in d_edges[d_cell][d_value]:
+        d_parent[find(d_parent, d_node)] = d_root
+    d_cells = len(d_board)
+    if d_value==VALUE_RED:
+        d_first, d_second = d_cells, d_cells+1
+    else:
+        d_first, d_second = d_cells+2, d_cells+3
+    if find(d_parent, d_first)==find(d_parent, d_second):
+        d_game["winner"] = d_value
+
+def strategy_random(d_game, d_size):
+    # the last empty cell of the shuffled order is a uniform pick among the empty cells
+    if d_game["empty"]==0:
         # END OF GAME
         # print("# Game Over.")
         sys.exit(0)
-    # randomized
-    random.shuffle(d_available_pos)
-    return d_available_pos[0]
+    d_cell = d_game["order"][d_game["empty"]-1]
+    return (d_cell//d_size, d_cell%d_size)
+
+def play_random_game(d_size, d_random=random):
+    # plays both sides at random until one connects, returns (winner, number of moves); the same
+    # steps as new_game and play_cell, kept in locals because this loop is the throughput path
+    d_neighbors, d_edges = build_geometry(d_size)
+    d_cells = d_size*d_size
+    d_order = list(range(d_cells))
+    d_random.shuffle(d_order)
+    d_board = [VALUE_EMPTY]*d_cells
+    d_parent = list(range(d_cells+4))
+    d_goals = {VALUE_RED: (d_cells, d_cells+1), VALUE_BLUE: (d_cells+2, d_cells+3)}
+    d_value = VALUE_RED
+    # nobody else moves, so the shuffled order is played from its end without any swaps
+    for d_moves in range(1, d_cells+1):
+        d_cell = d_order[d_cells-d_moves]
+        d_board[d_cell] = d_value
+        for d_node in d_neighbors[d_cell]:
+            if d_board[d_node]==d_value:
+                d_node = find(d_parent, d_node)
+                if d_node!=d_cell:
+                    d_parent[d_node] = d_cell
+        for d_node in d_edges[d_cell][d_value]:
+            d_parent[find(d_parent, d_node)] = d_cell
+        d_first, d_second = d_goals[d_value]
+        if find(d_parent, d_first)==find(d_parent, d_second):
+            return d_value, d_moves
+        d_value = -d_value
+    return VALUE_EMPTY, d_cells
+
+def play_random_games(d_size, d_games, d_seed=None):
+    # (red wins, total moves) over d_games random games
+    d_random = random.Random(d_seed)
+    d_red = 0
+    d_total = 0
+    for g in range(d_games):
+        d_winner, d_moves = play_random_game(d_size, d_random)
+        if d_winner==VALUE_RED:
+            d_red += 1
+        d_total += d_moves
+    return d_red, d_total
 
 def print_board(d_board, d_size):
     print("     ",end="")
@@ -130,16 +229,18 @@ def print_board(d_board, d_size):
 
 def main(argv):
     try:
-        opts, args = getopt.getopt(argv, "dp:s:", ["debug","player=","size="])
+        opts, args = getopt.getopt(argv, "dp:s:g:", ["debug","player=","size=","games=","seed="])
     except getopt.GetoptError:
-        print('Error: RandomHex.py [-d] [-p <ai_color>] [-s <board_size>]')
-        print('.  or: RandomHex.py [--debug] [--player=<ai_color>] [--size=<board_size>]')
+        print('Error: RandomHex.py [-d] [-p <ai_color>] [-s <board_size>] [-g <games>]')
+        print('.  or: RandomHex.py [--debug] [--player=<ai_color>] [--size=<board_size>] [--games=<games>] [--seed=<seed>]')
         sys.exit(2)
 
     # default arguments
     arg_player = "RED"
     arg_size = 7
     arg_debug = False
+    arg_games = 0
+    arg_seed = None
     for opt, arg in opts:
         if opt in ("-d","--debug"):
             arg_debug = True
@@ -156,17 +257,43 @@ def main(argv):
             except Exception:
                 print('Error: Invalid size, should be integer in [1,26].')
                 sys.exit(2)
+        elif opt in ("-g","--games"):
+            try:
+                arg_games = int(arg)
+                if arg_games<=0:
+                    raise Exception()
+            except Exception:
+                print('Error: Invalid number of games, should be a positive integer.')
+                sys.exit(2)
+        elif opt=="--seed":
+            try:
+                arg_seed = int(arg)
+            except Exception:
+                print('Error: Invalid seed, should be an integer.')
+                sys.exit(2)
+
+    if arg_games>0:
+        # library mode: random games against each other, timed
+        d_start = time.time()
+        d_red, d_total = play_random_games(arg_size, arg_games, arg_seed)
+        d_elapsed = time.time()-d_start
+        print("# {} games on {}x{} in {:.2f}s: {:.0f} games/s, {:.1f} moves per game, red wins {:.3f}".format(
+            arg_games, arg_size, arg_size, d_elapsed, arg_games/max(d_elapsed, 1e-9), d_total/arg_games, d_red/arg_games))
+        sys.exit(0)
 
     # print("# player: {}".format(arg_player))
     # print("# size: {}".format(arg_size))
 
     # initialize the game
     hex_board = [[VALUE_EMPTY for j in range(arg_size)] for i in range(arg_size)]
+    if arg_seed is not None:
+        random.seed(arg_seed)
+    hex_game = new_game(arg_size)
 
     while(True):
         if arg_player=="RED":
             # RED playes first
-            c_pos = strategy_random(hex_board, arg_size)
+            c_pos = strategy_random(hex_game, arg_size)
             c_inp = pos_to_inp(c_pos, arg_size)
             # introduce random time pause
             # time.sleep(random.randint(0,4))
@@ -177,12 +304,16 @@ def main(argv):
             c_pos = inp_to_pos(c_inp, arg_size)
         # RED MOVES
         update_board(hex_board, c_pos, VALUE_RED, arg_size)
+        play_cell(hex_game, c_pos[0]*arg_size+c_pos[1], VALUE_RED)
         if arg_debug:
             print_board(hex_board, arg_size)
+        if hex_game["winner"]!=VALUE_EMPTY:
+            # END OF GAME
+            sys.exit(0)
 
         if arg_player=="BLUE":
             # BLUE playes
-            c_pos = strategy_random(hex_board, arg_size)
+            c_pos = strategy_random(hex_game, arg_size)
             c_inp = pos_to_inp(c_pos, arg_size)
             # introduce random time pause
             # time.sleep(random.randint(0,4))
@@ -193,8 +324,12 @@ def main(argv):
             c_pos = inp_to_pos(c_inp, arg_size)
         # BLUE MOVES
         update_board(hex_board, c_pos, VALUE_BLUE, arg_size)
+        play_cell(hex_game, c_pos[0]*arg_size+c_pos[1], VALUE_BLUE)
         if arg_debug:
             print_board(hex_board, arg_size)
+        if hex_game["winner"]!=VALUE_EMPTY:
+            # END OF GAME
+            sys.exit(0)
 
 
 if __name__=="__main__":